@@ -2,20 +2,91 @@
 # Original code licensed under GPL-2.0 License
 
 import argparse
+import atexit
+import contextlib
+import functools
 import logging
+import mmap
 import os
+import queue
+import random
+import select
+import shutil
+import socket
+import stat
+import struct
 import subprocess
 import sys
 import time
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
 
-import psutil
-import tftpy
+from pyroute2 import IPRoute, NetlinkError
+from pyroute2.netlink.rtnl import RTMGRP_LINK
+from pyroute2.netlink.rtnl.ndmsg import NUD_REACHABLE
+
+from tftp_router_flasher import windowed
+
+# Largest TFTP block that still fits a standard 1500-byte Ethernet MTU
+# (1500 - 20 IP - 8 UDP - 4 TFTP header), negotiated via RFC 2348.
+TFTP_BLKSIZE = 1468
+
+# rtnetlink is Linux-only; pyroute2's IPRoute on macOS lacks the address,
+# link and route requests, so other platforms keep using the ip command.
+_NETLINK = sys.platform.startswith("linux")
+
+# Resolved once rather than by a PATH walk on every subprocess call
+_IP_BIN = shutil.which("ip") or "/sbin/ip"
+_PING_BIN = shutil.which("ping") or "/bin/ping"
+
+# Firmware sizes recorded when a path is validated, so the upload can
+# advertise the size (RFC 2349 tsize) without another stat().
+_FW_SIZE_CACHE: dict[str, int] = {}
+
+# Local addresses tried when the router does not answer at its hostname
+_FALLBACK_IPS = tuple(f"192.168.1.{i}" for i in range(2, 26))
+
+_ICMP_ECHO = struct.Struct("!BBHHH")
+# Seconds to wait for an echo reply on the socket path. The router is on the
+# local link, so a reply taking longer than this is as good as lost; retries
+# and backoff in ping_host cover a device that is still booting.
+PING_TIMEOUT = 0.2
+
+ETH_P_ARP = 0x0806
+# Ethernet header followed by an IPv4-over-Ethernet ARP payload.
+_ARP_FRAME = struct.Struct("!6s6sHHHBBH6s4s6s4s")
+
+
+# Listeners started by setup_logger, stopped (and drained) at exit.
+_log_listeners: list[QueueListener] = []
+
+
+def _stop_log_listeners() -> None:
+    """Stop every log listener, writing out any records still queued."""
+    while _log_listeners:
+        listener = _log_listeners.pop()
+        listener.stop()
+        # logging.shutdown() only holds weak references to handlers, and
+        # these die with the listener, so flush the file buffer here.
+        for handler in listener.handlers:
+            handler.flush()
+
+
+atexit.register(_stop_log_listeners)
 
 
 def setup_logger(debug_enabled: bool) -> logging.Logger:
     """
     Configure and set up a logger with both console and file handlers.
 
+    Console output is written synchronously, because it shares stderr with
+    the interactive prompt and must appear before it. File records are only
+    enqueued; a background QueueListener formats and writes them, so the
+    probe and upload loops never block on disk I/O.
+
+    File output is buffered in memory and written out every 1024 records,
+    on any ERROR record, and when logging shuts down at exit, so debug
+    logging does not cost a write() per message during an upload.
+
     Args:
         debug_enabled (bool): If True, sets console log level to DEBUG, otherwise INFO.
 
@@ -33,14 +104,36 @@ def setup_logger(debug_enabled: bool) -> logging.Logger:
 
     fh = logging.FileHandler("TFTPRouterFlasher.log")
     fh.setLevel(logging.DEBUG)
-    fh.setFormatter(formatter)
+    fh.setFormatter(logging.Formatter("%(created).3f - %(levelname)s - %(message)s"))
+
+    mh = MemoryHandler(capacity=1024, flushLevel=logging.ERROR, target=fh)
+    mh.setLevel(logging.DEBUG)
+
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    listener = QueueListener(records, mh, respect_handler_level=True)
+    listener.start()
+    _log_listeners.append(listener)
 
     logger.addHandler(ch)
-    logger.addHandler(fh)
+    logger.addHandler(QueueHandler(records))
 
     return logger
 
 
+@functools.lru_cache(maxsize=1)
+def _iface_names() -> frozenset[str]:
+    """
+    Return the names of all network interfaces on the system.
+
+    Uses if_nameindex(3), which lists interface names without enumerating
+    their addresses. The result is cached for the lifetime of the process.
+
+    Returns:
+        frozenset[str]: Interface names.
+    """
+    return frozenset(name for _, name in socket.if_nameindex())
+
+
 def validate_interface(interface: str) -> bool:
     """
     Check if the specified network interface exists on the system.
@@ -51,7 +144,21 @@ def validate_interface(interface: str) -> bool:
     Returns:
         bool: True if interface exists, False otherwise.
     """
-    return interface in psutil.net_if_addrs()
+    return interface in _iface_names()
+
+
+@functools.lru_cache(maxsize=1)
+def _iproute() -> IPRoute:
+    """
+    Return the process-wide netlink socket for interface queries and setup.
+
+    The socket is opened on first use and reused for every subsequent
+    request, instead of spawning an ``ip`` process per operation.
+
+    Returns:
+        IPRoute: Open rtnetlink socket.
+    """
+    return IPRoute()
 
 
 def get_ip_info(interface: str) -> tuple[str, str]:
@@ -64,17 +171,26 @@ def get_ip_info(interface: str) -> tuple[str, str]:
     Returns:
         tuple[str, str]: (IP address, netmask) or empty strings if not found.
     """
-    result = subprocess.run(
-        ["ip", "-4", "addr", "show", interface],
-        capture_output=True,
-        text=True,
-    )
-    for line in result.stdout.splitlines():
-        if "inet " in line:
-            ip = line.strip().split()[1].split("/")[0]
-            netmask = line.strip().split()[1].split("/")[1]
-            return ip, netmask
-    return "", ""
+    if not _NETLINK:
+        result = subprocess.run(
+            [_IP_BIN, "-4", "addr", "show", interface],
+            capture_output=True,
+        )
+        tokens = result.stdout.split()
+        if b"inet" not in tokens[:-1]:
+            return "", ""
+        ip, _, prefix = tokens[tokens.index(b"inet") + 1].partition(b"/")
+        return ip.decode(), prefix.decode()
+
+    ipr = _iproute()
+    try:
+        indices = ipr.link_lookup(ifname=interface)
+        addrs = ipr.get_addr(family=socket.AF_INET, index=indices[0]) if indices else ()
+    except NetlinkError:
+        return "", ""
+    if not addrs:
+        return "", ""
+    return str(addrs[0].get_attr("IFA_ADDRESS")), str(addrs[0]["prefixlen"])
 
 
 def get_default_gateway() -> str:
@@ -84,13 +200,46 @@ def get_default_gateway() -> str:
     Returns:
         str: Default gateway IP address, or empty string if not found.
     """
-    result = subprocess.run(["ip", "route"], capture_output=True, text=True)
-    for line in result.stdout.splitlines():
-        if line.startswith("default"):
-            return line.split()[2]
+    if not _NETLINK:
+        result = subprocess.run([_IP_BIN, "route"], capture_output=True)
+        for line in result.stdout.splitlines():
+            parts = line.split(maxsplit=3)
+            if len(parts) >= 3 and parts[0] == b"default" and parts[1] == b"via":
+                return parts[2].decode()
+        return ""
+
+    try:
+        routes = _iproute().get_default_routes(family=socket.AF_INET)
+    except NetlinkError:
+        return ""
+    for route in routes:
+        # Skip default routes without a next hop, e.g. "default dev wg0".
+        gateway = route.get_attr("RTA_GATEWAY")
+        if gateway:
+            return str(gateway)
     return ""
 
 
+def resolve_host(hostname: str) -> str:
+    """
+    Resolve a hostname to an IPv4 address once, up front.
+
+    The ping check and the upload then use the same address, so a name is
+    looked up once rather than by each step.
+
+    Args:
+        hostname (str): Router hostname or IP address.
+
+    Returns:
+        str: IPv4 address, or the hostname unchanged if it does not resolve.
+    """
+    try:
+        info = socket.getaddrinfo(hostname, 69, socket.AF_INET, socket.SOCK_DGRAM)
+    except socket.gaierror:
+        return hostname
+    return str(info[0][4][0])
+
+
 def print_connection_info(
     hostname: str,
     ipaddr: str,
@@ -114,22 +263,148 @@ def print_connection_info(
     logger.info(f"Gateway: {gateway}")
 
 
+def _icmp_checksum(data: bytes) -> int:
+    """
+    Compute the RFC 1071 internet checksum of an ICMP message.
+
+    Args:
+        data (bytes): Message with its checksum field zeroed.
+
+    Returns:
+        int: 16-bit checksum.
+    """
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(int.from_bytes(data[i : i + 2], "big") for i in range(0, len(data), 2))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _ping_socket(ip: str, timeout: float) -> bool | None:
+    """
+    Send one ICMP echo request over a socket instead of running ping.
+
+    An unprivileged ICMP datagram socket (permitted by
+    net.ipv4.ping_group_range) is tried first, then a raw socket, which
+    needs root or CAP_NET_RAW.
+
+    Args:
+        ip (str): IP address to ping.
+        timeout (float): Seconds to wait for the echo reply.
+
+    Returns:
+        bool | None: True on reply, False on timeout or network error, None
+            if no ICMP socket could be opened.
+    """
+    ident = os.getpid() & 0xFFFF
+    for kind in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+        try:
+            sock = socket.socket(socket.AF_INET, kind, socket.IPPROTO_ICMP)
+        except OSError:
+            continue
+        break
+    else:
+        return None
+
+    request = _ICMP_ECHO.pack(8, 0, 0, ident, 1)
+    request = _ICMP_ECHO.pack(8, 0, _icmp_checksum(request), ident, 1)
+    with sock:
+        deadline = time.monotonic() + timeout
+        try:
+            sock.connect((ip, 0))
+            sock.send(request)
+            while (remaining := deadline - time.monotonic()) > 0:
+                sock.settimeout(remaining)
+                reply = sock.recv(1024)
+                if reply and reply[0] >> 4 == 4:  # raw sockets include the IP header
+                    reply = reply[(reply[0] & 0x0F) * 4 :]
+                if len(reply) < _ICMP_ECHO.size:
+                    continue
+                icmp_type, _, _, reply_ident, _ = _ICMP_ECHO.unpack_from(reply)
+                # Datagram sockets rewrite the identifier and only deliver
+                # replies to their own requests; raw sockets see everything.
+                if icmp_type == 0 and (
+                    kind == socket.SOCK_DGRAM or reply_ident == ident
+                ):
+                    return True
+        except OSError:  # includes the recv timeout
+            pass
+    return False
+
+
+def _ping_command(ip: str) -> list[str]:
+    """
+    Build the command line for a single ping with a one-second reply wait.
+
+    iputils ping on Linux takes the -W wait in seconds, while macOS and
+    FreeBSD ping take it in milliseconds and reject the Linux -w deadline.
+
+    Args:
+        ip (str): IP address to ping.
+
+    Returns:
+        list[str]: Arguments for subprocess.run.
+    """
+    wait = "1" if sys.platform.startswith("linux") else "1000"
+    return [_PING_BIN, "-c", "1", "-W", wait, ip]
+
+
+def _arp_resolves(host: str) -> bool:
+    """
+    Check whether the kernel has recently confirmed a neighbour's address.
+
+    Only NUD_REACHABLE entries count. A STALE entry, e.g. for a router that
+    has since rebooted into rescue mode, says nothing about it answering
+    now, which /proc/net/arp cannot distinguish.
+
+    Args:
+        host (str): IPv4 address of the neighbour.
+
+    Returns:
+        bool: True if the host has a reachable entry with a link-layer
+            address, False otherwise or without rtnetlink.
+    """
+    if not _NETLINK:
+        return False
+    try:
+        neighbours = _iproute().get_neighbours(family=socket.AF_INET, dst=host)
+    except NetlinkError:
+        return False
+    return any(
+        n["state"] & NUD_REACHABLE
+        and n.get_attr("NDA_LLADDR") not in (None, "00:00:00:00:00:00")
+        for n in neighbours
+    )
+
+
 def ping_host(
     ip: str,
     no_ping: bool,
     logger: logging.Logger,
     retries: int = 3,
-    delay: int = 1,
+    base: float = 0.1,
+    cap: float = 2.0,
 ) -> bool:
     """
     Ping a host to check network connectivity with retry logic.
 
+    A host whose ARP entry the kernel has just confirmed is reachable
+    without sending anything. Otherwise each attempt sends the echo request
+    from an ICMP socket when one can be opened, and runs the ping command
+    if not.
+
+    Failed attempts are retried after a capped exponential backoff with full
+    jitter, so a responsive host is retried almost immediately while a
+    silent one is given progressively longer to wake up.
+
     Args:
         ip (str): IP address to ping.
         no_ping (bool): If True, skip ping and return True (for bypass mode).
         logger (logging.Logger): Logger instance for output.
         retries (int): Number of ping attempts before giving up.
-        delay (int): Seconds to wait between retries.
+        base (float): Backoff ceiling in seconds after the first failure.
+        cap (float): Maximum backoff ceiling in seconds.
 
     Returns:
         bool: True if ping successful or no_ping is True, False otherwise.
@@ -137,12 +412,20 @@ def ping_host(
     if no_ping:
         return True
 
-    for _ in range(retries):
+    if _arp_resolves(ip):
+        logger.info(f"{ip} is reachable (ARP entry confirmed)")
+        return True
+
+    for attempt in range(retries):
         logger.info(f"Pinging IP: {ip}")
-        result = subprocess.run(["ping", "-c", "1", ip], stdout=subprocess.DEVNULL)
-        if result.returncode == 0:
+        reachable = _ping_socket(ip, timeout=PING_TIMEOUT)
+        if reachable is None:
+            result = subprocess.run(_ping_command(ip), stdout=subprocess.DEVNULL)
+            reachable = result.returncode == 0
+        if reachable:
             return True
-        time.sleep(delay)
+        if attempt + 1 < retries:
+            time.sleep(random.uniform(0, min(cap, base * 2**attempt)))  # nosec B311
     return False
 
 
@@ -156,6 +439,8 @@ def configure_interface(
     """
     Configure network interface with specified IP, netmask, and gateway.
 
+    On Linux this goes over rtnetlink; elsewhere the ip command is run.
+
     Args:
         interface (str): Network interface to configure.
         ip (str): IP address to assign.
@@ -164,10 +449,240 @@ def configure_interface(
         logger (logging.Logger): Logger instance for output.
     """
     logger.debug(f"Configuring interface {interface} with IP {ip}")
-    subprocess.run(["ip", "addr", "flush", "dev", interface])
-    subprocess.run(["ip", "addr", "add", f"{ip}/{netmask}", "dev", interface])
-    subprocess.run(["ip", "link", "set", interface, "up"])
-    subprocess.run(["ip", "route", "add", "default", "via", gateway])
+    if not _NETLINK:
+        # iproute2mac, the usual ip off Linux, has no -batch mode, so the
+        # steps cannot be sent to a single process.
+        subprocess.run([_IP_BIN, "addr", "flush", "dev", interface])
+        subprocess.run([_IP_BIN, "addr", "add", f"{ip}/{netmask}", "dev", interface])
+        subprocess.run([_IP_BIN, "link", "set", interface, "up"])
+        subprocess.run([_IP_BIN, "route", "add", "default", "via", gateway])
+        return
+
+    ipr = _iproute()
+    indices = ipr.link_lookup(ifname=interface)
+    if not indices:
+        logger.warning(f"Failed to configure interface {interface}: not found")
+        return
+    try:
+        idx = indices[0]
+        ipr.flush_addr(index=idx)
+        ipr.addr("add", index=idx, address=ip, prefixlen=int(netmask))
+        ipr.link("set", index=idx, state="up")
+    except NetlinkError as e:
+        logger.warning(f"Failed to configure interface {interface}: {e}")
+        return
+    try:
+        ipr.route("add", dst="default", gateway=gateway)
+    except NetlinkError as e:
+        logger.debug(f"Default route via {gateway} not added: {e}")
+
+
+def _wait_for_link_up(interface: str, timeout: float) -> bool:
+    """
+    Wait until the interface reports an operational link, or time out.
+
+    Link events are subscribed to before the current state is read, so a
+    transition between the two cannot be missed. Drivers that cannot
+    detect carrier report UNKNOWN, which the kernel treats as usable.
+
+    Without rtnetlink there is no link state to watch, so the full timeout
+    is slept and the link is assumed to be up.
+
+    Args:
+        interface (str): Network interface to watch.
+        timeout (float): Maximum seconds to wait.
+
+    Returns:
+        bool: True if the link is up, False on timeout or if its state
+            cannot be read.
+    """
+    if not _NETLINK:
+        time.sleep(timeout)
+        return True
+
+    deadline = time.monotonic() + timeout
+    try:
+        with IPRoute() as events:
+            events.bind(groups=RTMGRP_LINK)
+            ipr = _iproute()
+            indices = ipr.link_lookup(ifname=interface)
+            if not indices:
+                return False
+            index = indices[0]
+            state = ipr.get_links(index)[0].get_attr("IFLA_OPERSTATE")
+            if state in ("UP", "UNKNOWN"):
+                return True
+            while (remaining := deadline - time.monotonic()) > 0:
+                ready, _, _ = select.select([events], [], [], remaining)
+                if not ready:
+                    break
+                for msg in events.get():
+                    if (
+                        msg.get("event") == "RTM_NEWLINK"
+                        and msg["index"] == index
+                        and msg.get_attr("IFLA_OPERSTATE") in ("UP", "UNKNOWN")
+                    ):
+                        return True
+    except (NetlinkError, OSError):
+        pass
+    return False
+
+
+def _arp_probe(
+    interface: str,
+    target: str,
+    candidates: tuple[str, ...],
+    timeout: float = 1.0,
+) -> str | None:
+    """
+    Find a local IP the target answers ARP for, probing all candidates at once.
+
+    One broadcast ARP request for the target is sent per candidate source
+    address, then replies are collected until the timeout expires.
+
+    Args:
+        interface (str): Network interface to probe on.
+        target (str): IP address of the router.
+        candidates (tuple[str, ...]): Local IP addresses to probe from.
+        timeout (float): Seconds to wait for a reply.
+
+    Returns:
+        str | None: First candidate the target replied to, or None if there
+            was no reply or raw sockets are unavailable (non-Linux, no
+            CAP_NET_RAW).
+    """
+    target_ip = socket.inet_aton(target)
+    try:
+        sock = socket.socket(
+            socket.AF_PACKET,
+            socket.SOCK_RAW,
+            socket.htons(ETH_P_ARP),
+        )
+    except (AttributeError, OSError):
+        return None
+    with sock:
+        try:
+            sock.bind((interface, ETH_P_ARP))
+            mac = sock.getsockname()[4]
+            for src in candidates:
+                sock.send(
+                    _ARP_FRAME.pack(
+                        b"\xff" * 6,
+                        mac,
+                        ETH_P_ARP,
+                        1,  # Ethernet
+                        0x0800,  # IPv4
+                        6,
+                        4,
+                        1,  # request
+                        mac,
+                        socket.inet_aton(src),
+                        b"\x00" * 6,
+                        target_ip,
+                    )
+                )
+            deadline = time.monotonic() + timeout
+            while (remaining := deadline - time.monotonic()) > 0:
+                sock.settimeout(remaining)
+                frame = sock.recv(128)
+                if len(frame) < _ARP_FRAME.size:
+                    continue
+                fields = _ARP_FRAME.unpack_from(frame)
+                if fields[7] == 2 and fields[9] == target_ip:  # reply from target
+                    local_ip = socket.inet_ntoa(fields[11])
+                    if local_ip in candidates:
+                        return local_ip
+        except OSError:  # includes the recv timeout
+            pass
+    return None
+
+
+def _last_success_path() -> str:
+    """
+    Return the path of the file remembering the last local IP that worked.
+
+    Returns:
+        str: Path under $XDG_CACHE_HOME, or ~/.cache if it is unset.
+    """
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache, "tftp_router_flasher", "last_success")
+
+
+def _load_last_success() -> str | None:
+    """
+    Read the local IP that last reached the router, if any.
+
+    Returns:
+        str | None: A fallback candidate IP, or None if nothing usable is
+            cached.
+    """
+    try:
+        with open(_last_success_path()) as f:
+            ip = f.read().strip()
+    except OSError:
+        return None
+    return ip if ip in _FALLBACK_IPS else None
+
+
+def _cache_owner(directory: str) -> tuple[int, int] | None:
+    """
+    Decide who should own cache entries created below a directory.
+
+    The tool runs as root, and sudo usually keeps HOME pointing at the
+    invoking user's home. Entries created there are handed back to that
+    user instead of leaving root-owned directories behind.
+
+    Args:
+        directory (str): Existing directory the cache is created in.
+
+    Returns:
+        tuple[int, int] | None: (uid, gid) to chown new entries to, or None
+            to leave them owned by the current user.
+
+    Raises:
+        PermissionError: If running as root in a directory owned by a user
+            that sudo does not identify as the invoking one.
+    """
+    if os.geteuid() != 0:
+        return None
+    st = os.stat(directory)
+    if st.st_uid == 0:
+        return None
+    if os.environ.get("SUDO_UID") != str(st.st_uid):
+        msg = f"Not writing to a cache owned by uid {st.st_uid}"
+        raise PermissionError(msg)
+    return st.st_uid, int(os.environ.get("SUDO_GID") or st.st_gid)
+
+
+def _save_last_success(ip: str) -> None:
+    """
+    Remember the local IP that reached the router, for the next run.
+
+    The file is replaced atomically. Failures are ignored: the cache only
+    reorders the sweep and is never required.
+
+    Args:
+        ip (str): Local IP address to remember.
+    """
+    path = _last_success_path()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    created = []
+    parent = os.path.dirname(os.path.abspath(path))
+    while not os.path.isdir(parent):
+        created.append(parent)
+        parent = os.path.dirname(parent)
+    try:
+        owner = _cache_owner(parent)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "w") as f:
+            f.write(f"{ip}\n")
+        if owner is not None:
+            for entry in [*reversed(created), tmp]:
+                os.chown(entry, *owner)
+        os.replace(tmp, path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
 
 
 def try_default_ip_range(
@@ -176,12 +691,16 @@ def try_default_ip_range(
     timeout: int,
     no_ping: bool,
     logger: logging.Logger,
+    windowsize: int = 1,
 ) -> bool:
     """
     Attempt firmware upload using common default IP ranges for routers.
 
-    This method tries IPs from 192.168.1.2 to 192.168.1.25, configuring
-    the local interface and attempting TFTP upload for each.
+    The local IPs 192.168.1.2 to 192.168.1.25 are first probed in parallel
+    with ARP, and only the one the router answers for is configured. If
+    ARP gives no answer, each IP is configured and pinged in turn, starting
+    with the interface's current address when the kernel has just confirmed
+    the router's ARP entry, or else with the IP that worked last time.
 
     Args:
         interface (str): Network interface to use.
@@ -189,41 +708,118 @@ def try_default_ip_range(
         timeout (int): TFTP timeout in seconds.
         no_ping (bool): Whether to skip ping checks.
         logger (logging.Logger): Logger instance for output.
+        windowsize (int): RFC 7440 window size to request for the upload.
 
     Returns:
         bool: True if upload successful, False if all attempts fail.
     """
-    for i in range(2, 26):
-        test_ip = f"192.168.1.{i}"
+    candidates = _FALLBACK_IPS
+    local_ip = _arp_probe(interface, "192.168.1.1", candidates)
+    if local_ip is not None:
+        logger.info(f"Router answered ARP for local IP {local_ip}")
+        candidates = (local_ip,)
+    else:
+        first = None
+        if _arp_resolves("192.168.1.1"):
+            current, _ = get_ip_info(interface)
+            if current in candidates:
+                logger.debug(f"Router already known via ARP, trying {current} first")
+                first = current
+        if first is None:
+            first = _load_last_success()
+        if first is not None:
+            candidates = (first, *(ip for ip in candidates if ip != first))
+
+    for test_ip in candidates:
         configure_interface(interface, test_ip, "24", "192.168.1.1", logger)
-        time.sleep(2)
+        if not _wait_for_link_up(interface, timeout=2.0):
+            logger.debug(f"Link on {interface} is not up yet")
         if ping_host("192.168.1.1", no_ping, logger):
-            return upload_binary_using_tftp("192.168.1.1", firmware, timeout, logger)
+            if not upload_binary_using_tftp(
+                "192.168.1.1", firmware, timeout, logger, windowsize
+            ):
+                return False
+            _save_last_success(test_ip)
+            return True
     return False
 
 
+class _MappedFirmware:
+    """
+    Read-only memory mapping of a firmware image.
+
+    The uploader slices DATA blocks straight out of the mapping, so the
+    image is paged in by the kernel instead of being read() into buffers.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        try:
+            if hasattr(os, "posix_fadvise"):
+                fd = self._file.fileno()
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+
+    @property
+    def buffer(self) -> mmap.mmap:
+        return self._map
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "_MappedFirmware":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
 def upload_binary_using_tftp(
     hostname: str,
     firmware: str,
     timeout: int,
     logger: logging.Logger,
+    windowsize: int = 1,
 ) -> bool:
     """
     Upload firmware file to router using TFTP protocol.
 
+    A larger block size is requested so that fewer lock-step DATA/ACK round
+    trips are needed. A windowsize above 1 additionally asks for RFC 7440
+    windows, so that many blocks are sent per ACK. If the server ignores
+    the options, the transfer falls back to lock-step 512-byte blocks. If
+    the firmware was validated first, its size is sent as the tsize
+    option, letting the router refuse an image it has no room for before
+    any data is sent.
+
     Args:
         hostname (str): Router IP address/hostname.
         firmware (str): Path to firmware file to upload.
         timeout (int): TFTP operation timeout in seconds.
         logger (logging.Logger): Logger instance for output.
+        windowsize (int): RFC 7440 window size to request; 1 disables it.
 
     Returns:
         bool: True if upload successful, False on error.
     """
     logger.info(f"Uploading firmware to {hostname}")
     try:
-        client = tftpy.TftpClient(hostname, 69)
-        client.upload(os.path.basename(firmware), firmware, timeout=timeout)
+        with _MappedFirmware(firmware) as image:
+            windowed.upload(
+                hostname,
+                os.path.basename(firmware),
+                image.buffer,
+                TFTP_BLKSIZE,
+                windowsize,
+                timeout,
+                logger,
+                tsize=_FW_SIZE_CACHE.get(firmware),
+            )
         logger.info("Upload complete")
         return True
     except Exception as e:
@@ -231,21 +827,95 @@ def upload_binary_using_tftp(
         return False
 
 
-def validate_firmware_path(firmware: str, logger: logging.Logger) -> bool:
+def _firmware_error(firmware: str) -> str | None:
     """
-    Validate that the firmware file exists and is accessible.
+    Describe why a firmware path cannot be used.
 
     Args:
         firmware (str): Path to firmware file.
-        logger (logging.Logger): Logger instance for error output.
 
     Returns:
-        bool: True if firmware file exists, False otherwise.
+        str | None: Error message, or None if firmware is a readable,
+            non-empty regular file.
     """
-    if not os.path.isfile(firmware):
-        logger.error(f"Invalid firmware path: {firmware}")
-        return False
-    return True
+    try:
+        st = os.stat(firmware)
+    except OSError:
+        return f"Invalid firmware path: {firmware}"
+    if not stat.S_ISREG(st.st_mode):
+        return f"Invalid firmware path: {firmware}"
+    if st.st_size == 0:
+        return f"Firmware file is empty: {firmware}"
+    _FW_SIZE_CACHE[firmware] = st.st_size
+    if not os.access(firmware, os.R_OK):
+        return f"Firmware file is not readable: {firmware}"
+    return None
+
+
+def _interface_arg(interface: str) -> str:
+    """
+    Argparse type for --interface, rejecting unknown interfaces.
+
+    Args:
+        interface (str): Network interface name given on the command line.
+
+    Returns:
+        str: The interface name, unchanged.
+
+    Raises:
+        argparse.ArgumentTypeError: If the interface does not exist.
+    """
+    if not validate_interface(interface):
+        msg = f"Interface {interface} not found"
+        raise argparse.ArgumentTypeError(msg)
+    return interface
+
+
+def _firmware_arg(firmware: str) -> str:
+    """
+    Argparse type for --firmware, rejecting unusable firmware paths.
+
+    Checking readability here reports a permission problem immediately,
+    rather than as a TFTP failure once the router has been set up.
+
+    Args:
+        firmware (str): Firmware path given on the command line.
+
+    Returns:
+        str: The firmware path, unchanged.
+
+    Raises:
+        argparse.ArgumentTypeError: If the firmware file cannot be read.
+    """
+    error = _firmware_error(firmware)
+    if error:
+        raise argparse.ArgumentTypeError(error)
+    return firmware
+
+
+def _windowsize_arg(value: str) -> int:
+    """
+    Argparse type for --windowsize, rejecting sizes RFC 7440 does not allow.
+
+    Args:
+        value (str): Window size given on the command line.
+
+    Returns:
+        int: The window size.
+
+    Raises:
+        argparse.ArgumentTypeError: If value is not an integer between 1
+            and windowed.MAX_WINDOWSIZE.
+    """
+    try:
+        windowsize = int(value)
+    except ValueError:
+        msg = f"invalid int value: {value!r}"
+        raise argparse.ArgumentTypeError(msg) from None
+    if not 1 <= windowsize <= windowed.MAX_WINDOWSIZE:
+        msg = f"must be between 1 and {windowed.MAX_WINDOWSIZE}"
+        raise argparse.ArgumentTypeError(msg)
+    return windowsize
 
 
 def upload_firmware(
@@ -255,6 +925,7 @@ def upload_firmware(
     timeout: int,
     no_ping: bool,
     logger: logging.Logger,
+    windowsize: int = 1,
 ) -> bool:
     """
     Main firmware upload orchestration function.
@@ -269,6 +940,7 @@ def upload_firmware(
         timeout (int): TFTP timeout in seconds.
         no_ping (bool): Whether to skip ping verification.
         logger (logging.Logger): Logger instance for output.
+        windowsize (int): RFC 7440 window size to request for the upload.
 
     Returns:
         bool: True if upload successful, False otherwise.
@@ -277,16 +949,19 @@ def upload_firmware(
     gateway = get_default_gateway()
     print_connection_info(hostname, ipaddr, netmask, gateway, logger)
 
-    if ping_host(hostname, no_ping, logger):
+    address = resolve_host(hostname)
+    if ping_host(address, no_ping, logger):
         logger.info("Router is reachable")
-        return upload_binary_using_tftp(hostname, firmware, timeout, logger)
+        return upload_binary_using_tftp(address, firmware, timeout, logger, windowsize)
 
     logger.warning("Router not reachable with current config")
     ans = input("Try default IP configurations? (Y/N): ").strip().lower()
     if ans != "y":
         return False
 
-    return try_default_ip_range(interface, firmware, timeout, no_ping, logger)
+    return try_default_ip_range(
+        interface, firmware, timeout, no_ping, logger, windowsize
+    )
 
 
 def main() -> None:
@@ -294,10 +969,16 @@ def main() -> None:
     Main entry point for TFTP Router Flasher application.
 
     Handles command line arguments, validates inputs, and orchestrates
-    the firmware upload process.
+    the firmware upload process. Invalid arguments are rejected by argparse
+    before the log file is opened.
     """
     parser = argparse.ArgumentParser(description="ASUS RT firmware rescue tool")
-    parser.add_argument("--firmware", required=True, help="Path to the firmware file")
+    parser.add_argument(
+        "--firmware",
+        type=_firmware_arg,
+        required=True,
+        help="Path to the firmware file",
+    )
     parser.add_argument("--hostname", default="192.168.1.1", help="Router IP address")
     parser.add_argument(
         "--timeout",
@@ -305,24 +986,28 @@ def main() -> None:
         default=120,
         help="TFTP timeout in seconds",
     )
-    parser.add_argument("--interface", default="en0", help="Network interface to use")
+    parser.add_argument(
+        "--interface",
+        type=_interface_arg,
+        default="en0",
+        help="Network interface to use",
+    )
     parser.add_argument(
         "--no-ping",
         action="store_true",
         help="Disable ping check. Useful on some models",
     )
+    parser.add_argument(
+        "--windowsize",
+        type=_windowsize_arg,
+        default=1,
+        help="TFTP blocks to send per ACK (RFC 7440). 1 uses plain TFTP",
+    )
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
     args = parser.parse_args()
 
     logger = setup_logger(args.debug)
 
-    if not validate_interface(args.interface):
-        logger.error(f"Interface {args.interface} not found")
-        sys.exit(1)
-
-    if not validate_firmware_path(args.firmware, logger):
-        sys.exit(1)
-
     if not upload_firmware(
         args.hostname,
         args.interface,
@@ -330,6 +1015,7 @@ def main() -> None:
         args.timeout,
         args.no_ping,
         logger,
+        args.windowsize,
     ):
         logger.error("Firmware upload failed")
         sys.exit(1)
@@ -0,0 +1,245 @@
+"""
+Windowed TFTP upload (RFC 7440).
+
+Plain TFTP is lock-step: each DATA block waits for its own ACK, so a
+transfer costs one round trip per block. With the windowsize option the
+server ACKs only the last block of each window, letting the client send
+several blocks back to back. With a windowsize of 1 the same sender does
+plain lock-step TFTP, and it falls back to 512-byte blocks whenever the
+server ignores the options.
+"""
+
+import logging
+import mmap
+import socket
+import struct
+import time
+
+OP_WRQ = 2
+OP_DATA = 3
+OP_ACK = 4
+OP_ERROR = 5
+OP_OACK = 6
+
+DEFAULT_BLKSIZE = 512
+MAX_WINDOWSIZE = 65535
+
+_HEADER = struct.Struct("!HH")
+
+
+class TFTPError(Exception):
+    """Raised when a windowed upload fails."""
+
+
+def _wrq(filename: str, options: dict[str, int]) -> bytes:
+    """
+    Build a write request carrying the given options.
+
+    Args:
+        filename (str): Remote file name.
+        options (dict[str, int]): TFTP options to request.
+
+    Returns:
+        bytes: Encoded WRQ packet.
+    """
+    parts = [filename.encode(), b"octet"]
+    for name, value in options.items():
+        parts += [name.encode(), str(value).encode()]
+    return struct.pack("!H", OP_WRQ) + b"\0".join(parts) + b"\0"
+
+
+def _parse_oack(packet: bytes) -> dict[str, str]:
+    """
+    Decode the options of an OACK packet.
+
+    Args:
+        packet (bytes): Raw OACK packet, including the opcode.
+
+    Returns:
+        dict[str, str]: Option names (lower-cased) mapped to their values.
+    """
+    fields = packet[2:].split(b"\0")
+    return {
+        fields[i].decode().lower(): fields[i + 1].decode()
+        for i in range(0, len(fields) - 1, 2)
+    }
+
+
+def _error_message(packet: bytes) -> str:
+    """
+    Format an ERROR packet for an exception message.
+
+    Args:
+        packet (bytes): Raw ERROR packet, including the opcode.
+
+    Returns:
+        str: Error code and server-supplied message.
+    """
+    code = _HEADER.unpack_from(packet)[1] if len(packet) >= 4 else 0
+    message = packet[4:].split(b"\0", 1)[0].decode(errors="replace")
+    return f"error {code}: {message}"
+
+
+def upload(
+    host: str,
+    filename: str,
+    image: bytes | mmap.mmap,
+    blksize: int,
+    windowsize: int,
+    timeout: float,
+    logger: logging.Logger,
+    port: int = 69,
+    retransmit: float = 1.0,
+    tsize: int | None = None,
+) -> None:
+    """
+    Upload a buffer to a TFTP server, negotiating blksize and windowsize.
+
+    If the server ignores the options, the transfer falls back to plain
+    lock-step TFTP with 512-byte blocks. DATA packets are sent with a
+    scatter/gather sendmsg() of a header and a slice of the image, so the
+    image is never copied into per-packet buffers.
+
+    Args:
+        host (str): Server IPv4 address.
+        filename (str): Remote file name.
+        image (bytes | mmap.mmap): Data to upload.
+        blksize (int): Block size to request.
+        windowsize (int): Number of blocks to send per ACK.
+        timeout (float): Seconds without progress before giving up.
+        logger (logging.Logger): Logger instance for output.
+        port (int): Server port for the initial request.
+        retransmit (float): Seconds to wait for an ACK before resending.
+        tsize (int | None): Image size to announce (RFC 2349), if known.
+
+    Raises:
+        TFTPError: If the server reports an error or stops responding.
+    """
+    if not 1 <= windowsize <= MAX_WINDOWSIZE:
+        msg = f"windowsize must be between 1 and {MAX_WINDOWSIZE}"
+        raise ValueError(msg)
+
+    address = socket.gethostbyname(host)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(min(retransmit, timeout))
+        options = {"blksize": blksize, "windowsize": windowsize}
+        if tsize is not None:
+            options["tsize"] = tsize
+        blksize, windowsize = _negotiate(
+            sock, address, port, filename, options, timeout
+        )
+        logger.info(f"TFTP blksize {blksize}, windowsize {windowsize}")
+        with memoryview(image) as view:
+            _send_blocks(sock, view, blksize, windowsize, timeout)
+
+
+def _negotiate(
+    sock: socket.socket,
+    host: str,
+    port: int,
+    filename: str,
+    options: dict[str, int],
+    timeout: float,
+) -> tuple[int, int]:
+    """
+    Send the WRQ and connect the socket to the server's transfer port.
+
+    Returns:
+        tuple[int, int]: Negotiated (blksize, windowsize).
+    """
+    blksize, windowsize = options["blksize"], options["windowsize"]
+    request = _wrq(filename, options)
+    deadline = time.monotonic() + timeout
+    sock.sendto(request, (host, port))
+    while True:
+        try:
+            packet, (address, tid) = sock.recvfrom(65536)
+        except TimeoutError:
+            if time.monotonic() > deadline:
+                msg = "Timed out waiting for the server to accept the upload"
+                raise TFTPError(msg) from None
+            sock.sendto(request, (host, port))
+            continue
+        if address != host or len(packet) < 2:
+            continue
+        opcode = struct.unpack_from("!H", packet)[0]
+        if opcode == OP_ERROR:
+            raise TFTPError(_error_message(packet))
+        if opcode == OP_OACK:
+            accepted = _parse_oack(packet)
+            negotiated = (
+                min(int(accepted.get("blksize", DEFAULT_BLKSIZE)), blksize),
+                max(1, min(int(accepted.get("windowsize", 1)), windowsize)),
+            )
+        elif opcode == OP_ACK and packet[2:4] == b"\0\0":
+            negotiated = (DEFAULT_BLKSIZE, 1)
+        else:
+            continue
+        # Bind the transfer to the server's TID; the kernel then drops
+        # datagrams from any other source.
+        sock.connect((address, tid))
+        return negotiated
+
+
+def _send_blocks(
+    sock: socket.socket,
+    view: memoryview,
+    blksize: int,
+    windowsize: int,
+    timeout: float,
+) -> None:
+    """
+    Send every DATA block, one window per ACK, resending on loss.
+
+    Blocks are numbered from 1 and the 16-bit block number wraps to 0. A
+    transfer whose size is a multiple of blksize ends with an empty block.
+    """
+    last = len(view) // blksize + 1
+    base = 1  # first block not yet acknowledged
+    last_progress = time.monotonic()
+    send_window = True
+    while True:
+        end = min(base + windowsize - 1, last)
+        if send_window:
+            for block in range(base, end + 1):
+                start = (block - 1) * blksize
+                sock.sendmsg(
+                    [
+                        _HEADER.pack(OP_DATA, block & 0xFFFF),
+                        view[start : start + blksize],
+                    ]
+                )
+        try:
+            packet = sock.recv(65536)
+        except TimeoutError:
+            if time.monotonic() - last_progress > timeout:
+                msg = f"Timed out waiting for ACK of block {base}"
+                raise TFTPError(msg) from None
+            send_window = True
+            continue
+        except ConnectionRefusedError:
+            msg = "Server closed the transfer port"
+            raise TFTPError(msg) from None
+        if len(packet) < 4:
+            send_window = False
+            continue
+        opcode, number = _HEADER.unpack_from(packet)
+        if opcode == OP_ERROR:
+            raise TFTPError(_error_message(packet))
+        # Map the 16-bit block number back onto the current window; the
+        # receiver ACKs the last block it got in order.
+        acked = next(
+            (b for b in range(base, end + 1) if b & 0xFFFF == number),
+            None,
+        )
+        if opcode != OP_ACK or acked is None:
+            # Stale or duplicate ACK. Resending on these would double every
+            # following window (Sorcerer's Apprentice), so wait for a fresh
+            # ACK or the retransmit timeout instead.
+            send_window = False
+            continue
+        if acked == last:
+            return
+        base = acked + 1
+        last_progress = time.monotonic()
+        send_window = True
@@ -1,5 +1,6 @@
 import os
 import tempfile
+from unittest.mock import patch
 
 import pytest
 
@@ -28,3 +29,10 @@ def mock_sleep():
     """Mock time.sleep for all tests to speed them up."""
     with patch("time.sleep"):
         yield
+
+
+@pytest.fixture
+def netlink():
+    """Exercise the netlink code paths regardless of the host platform."""
+    with patch("tftp_router_flasher.main._NETLINK", True):
+        yield
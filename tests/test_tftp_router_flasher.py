@@ -1,25 +1,60 @@
+import argparse
+import functools
 import logging
+import os
+import socket
+import stat
 import subprocess
+import tempfile
+from logging.handlers import MemoryHandler, QueueHandler
 from unittest.mock import Mock, call, patch
 
 import pytest
+from pyroute2 import NetlinkError
+from pyroute2.netlink.rtnl import RTMGRP_LINK
+from pyroute2.netlink.rtnl.ndmsg import NUD_REACHABLE, NUD_STALE
 
 # Import the module under test
+from tftp_router_flasher import windowed
 from tftp_router_flasher.main import (
+    _ARP_FRAME,
+    _FW_SIZE_CACHE,
+    _IP_BIN,
+    _PING_BIN,
+    ETH_P_ARP,
+    PING_TIMEOUT,
+    TFTP_BLKSIZE,
+    _arp_probe,
+    _arp_resolves,
+    _firmware_arg,
+    _icmp_checksum,
+    _iface_names,
+    _last_success_path,
+    _load_last_success,
+    _log_listeners,
+    _MappedFirmware,
+    _ping_command,
+    _ping_socket,
+    _save_last_success,
+    _stop_log_listeners,
+    _wait_for_link_up,
+    _windowsize_arg,
     configure_interface,
     get_default_gateway,
     get_ip_info,
     main,
     ping_host,
     print_connection_info,
+    resolve_host,
     setup_logger,
     try_default_ip_range,
     upload_binary_using_tftp,
     upload_firmware,
-    validate_firmware_path,
     validate_interface,
 )
 
+from .test_windowed import FakeWindowServer
+
 
 class TestSetupLogger:
     def setup_method(self):
@@ -32,6 +67,7 @@ class TestSetupLogger:
 
     def teardown_method(self):
         """Run after each test method."""
+        _stop_log_listeners()
         # Restore original state
         for handler in self.logger.handlers[:]:
             self.logger.removeHandler(handler)
@@ -42,33 +78,90 @@ class TestSetupLogger:
         logger = setup_logger(debug_enabled=True)
         assert logger.level == logging.DEBUG
         assert len(logger.handlers) == 2
+        assert isinstance(logger.handlers[1], QueueHandler)
+        assert len(_log_listeners[-1].handlers) == 1
 
     def test_setup_logger_debug_disabled(self):
         logger = setup_logger(debug_enabled=False)
         assert logger.level == logging.INFO
         assert len(logger.handlers) == 2
 
+    def test_setup_logger_buffers_file_output(self):
+        setup_logger(debug_enabled=True)
+        handlers = _log_listeners[-1].handlers
+        buffered = [h for h in handlers if isinstance(h, MemoryHandler)]
+        assert len(buffered) == 1
+        assert isinstance(buffered[0].target, logging.FileHandler)
+        assert buffered[0].flushLevel == logging.ERROR
+
+    def test_setup_logger_console_is_synchronous(self):
+        logger = setup_logger(debug_enabled=False)
+        console = logger.handlers[0]
+        assert type(console) is logging.StreamHandler
+        with patch.object(console, "emit") as mock_emit:
+            logger.warning("shown before any prompt")
+            # Written on the calling thread, not by the listener
+            mock_emit.assert_called_once()
+            logger.debug("hidden")
+
+        assert mock_emit.call_args[0][0].getMessage() == "shown before any prompt"
+
+    def test_setup_logger_listener_delivers_records(self):
+        logger = setup_logger(debug_enabled=False)
+        buffered = _log_listeners[-1].handlers[0]
+        with patch.object(buffered, "handle") as mock_handle:
+            logger.info("hello")
+            _stop_log_listeners()
+
+        mock_handle.assert_called_once()
+        assert mock_handle.call_args[0][0].getMessage() == "hello"
+
+    def test_stop_log_listeners_flushes_file_buffer(self):
+        setup_logger(debug_enabled=True)
+        buffered = _log_listeners[-1].handlers[0]
+        with patch.object(buffered, "flush") as mock_flush:
+            _stop_log_listeners()
+
+        mock_flush.assert_called_once()
+        assert _log_listeners == []
+
 
 class TestValidateInterface:
     def setup_method(self):
         """Run before each test method."""
-        pass  # No setup needed for this class
+        _iface_names.cache_clear()
 
     def teardown_method(self):
         """Run after each test method."""
-        pass  # No teardown needed for this class
+        _iface_names.cache_clear()
 
-    @patch("tftp_router_flasher.main.psutil.net_if_addrs")
-    def test_validate_interface_exists(self, mock_if_addrs):
-        mock_if_addrs.return_value = {"eth0": "mock", "wlan0": "mock"}
+    @patch("tftp_router_flasher.main.socket.if_nameindex")
+    def test_validate_interface_exists(self, mock_if_nameindex):
+        mock_if_nameindex.return_value = [(1, "eth0"), (2, "wlan0")]
         assert validate_interface("eth0") is True
 
-    @patch("tftp_router_flasher.main.psutil.net_if_addrs")
-    def test_validate_interface_not_exists(self, mock_if_addrs):
-        mock_if_addrs.return_value = {"eth0": "mock", "wlan0": "mock"}
+    @patch("tftp_router_flasher.main.socket.if_nameindex")
+    def test_validate_interface_not_exists(self, mock_if_nameindex):
+        mock_if_nameindex.return_value = [(1, "eth0"), (2, "wlan0")]
         assert validate_interface("nonexistent") is False
 
+    @patch("tftp_router_flasher.main.socket.if_nameindex")
+    def test_validate_interface_cached(self, mock_if_nameindex):
+        mock_if_nameindex.return_value = [(1, "eth0"), (2, "wlan0")]
+        assert validate_interface("eth0") is True
+        assert validate_interface("wlan0") is True
+        mock_if_nameindex.assert_called_once()
+
+
+def _nlmsg(attrs, **fields):
+    """Build a mock netlink message with get_attr() and item access."""
+    msg = Mock()
+    msg.get_attr.side_effect = attrs.get
+    msg.__getitem__ = Mock(side_effect=fields.__getitem__)
+    return msg
+
 
+@pytest.mark.usefixtures("netlink")
 class TestGetIPInfo:
     def setup_method(self):
         """Run before each test method."""
@@ -78,25 +171,51 @@ class TestGetIPInfo:
         """Run after each test method."""
         pass
 
-    @patch("tftp_router_flasher.main.subprocess.run")
-    def test_get_ip_info_success(self, mock_run):
-        mock_output = "2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc fq_codel state UP group default qlen 1000\n    inet 192.168.1.10/24 brd 192.168.1.255 scope global eth0"
-        mock_run.return_value = Mock(stdout=mock_output, returncode=0)
+    @patch("tftp_router_flasher.main._iproute")
+    def test_get_ip_info_success(self, mock_iproute):
+        ipr = mock_iproute.return_value
+        ipr.link_lookup.return_value = [2]
+        ipr.get_addr.return_value = (
+            _nlmsg({"IFA_ADDRESS": "192.168.1.10"}, prefixlen=24),
+        )
 
         ip, netmask = get_ip_info("eth0")
         assert ip == "192.168.1.10"
         assert netmask == "24"
+        ipr.get_addr.assert_called_once_with(family=socket.AF_INET, index=2)
 
-    @patch("tftp_router_flasher.main.subprocess.run")
-    def test_get_ip_info_no_inet(self, mock_run):
-        mock_output = "2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc fq_codel state UP group default qlen 1000"
-        mock_run.return_value = Mock(stdout=mock_output, returncode=0)
+    @patch("tftp_router_flasher.main._iproute")
+    def test_get_ip_info_no_inet(self, mock_iproute):
+        ipr = mock_iproute.return_value
+        ipr.link_lookup.return_value = [2]
+        ipr.get_addr.return_value = ()
 
         ip, netmask = get_ip_info("eth0")
         assert ip == ""
         assert netmask == ""
 
+    @patch("tftp_router_flasher.main._iproute")
+    def test_get_ip_info_no_interface(self, mock_iproute):
+        mock_iproute.return_value.link_lookup.return_value = []
+
+        assert get_ip_info("eth9") == ("", "")
+        mock_iproute.return_value.get_addr.assert_not_called()
 
+    @patch("tftp_router_flasher.main._NETLINK", False)
+    @patch("tftp_router_flasher.main._iproute")
+    @patch("tftp_router_flasher.main.subprocess.run")
+    def test_get_ip_info_without_netlink(self, mock_run, mock_iproute):
+        mock_output = b"en0: flags=8863<UP,BROADCAST,RUNNING> mtu 1500\n    inet 192.168.1.10/24 brd 192.168.1.255 en0"
+        mock_run.return_value = Mock(stdout=mock_output, returncode=0)
+
+        assert get_ip_info("en0") == ("192.168.1.10", "24")
+        mock_run.assert_called_once_with(
+            [_IP_BIN, "-4", "addr", "show", "en0"], capture_output=True
+        )
+        mock_iproute.assert_not_called()
+
+
+@pytest.mark.usefixtures("netlink")
 class TestGetDefaultGateway:
     def setup_method(self):
         """Run before each test method."""
@@ -106,22 +225,79 @@ class TestGetDefaultGateway:
         """Run after each test method."""
         pass
 
-    @patch("tftp_router_flasher.main.subprocess.run")
-    def test_get_default_gateway_found(self, mock_run):
-        mock_output = "default via 192.168.1.1 dev eth0 proto static"
-        mock_run.return_value = Mock(stdout=mock_output, returncode=0)
+    @patch("tftp_router_flasher.main._iproute")
+    def test_get_default_gateway_found(self, mock_iproute):
+        mock_iproute.return_value.get_default_routes.return_value = (
+            _nlmsg({"RTA_GATEWAY": "192.168.1.1", "RTA_OIF": 2}),
+        )
 
         gateway = get_default_gateway()
         assert gateway == "192.168.1.1"
 
-    @patch("tftp_router_flasher.main.subprocess.run")
-    def test_get_default_gateway_not_found(self, mock_run):
-        mock_output = "192.168.1.0/24 dev eth0 proto kernel scope link src 192.168.1.10"
-        mock_run.return_value = Mock(stdout=mock_output, returncode=0)
+    @patch("tftp_router_flasher.main._iproute")
+    def test_get_default_gateway_not_found(self, mock_iproute):
+        mock_iproute.return_value.get_default_routes.return_value = ()
 
         gateway = get_default_gateway()
         assert gateway == ""
 
+    @patch("tftp_router_flasher.main._iproute")
+    def test_get_default_gateway_without_via(self, mock_iproute):
+        mock_iproute.return_value.get_default_routes.return_value = (
+            _nlmsg({"RTA_OIF": 5}),
+            _nlmsg({"RTA_GATEWAY": "10.0.0.1", "RTA_OIF": 2}),
+        )
+
+        gateway = get_default_gateway()
+        assert gateway == "10.0.0.1"
+
+    @patch("tftp_router_flasher.main._NETLINK", False)
+    @patch("tftp_router_flasher.main._iproute")
+    @patch("tftp_router_flasher.main.subprocess.run")
+    def test_get_default_gateway_without_netlink(self, mock_run, mock_iproute):
+        mock_output = b"default dev utun3 scope link\ndefault via 10.0.0.1 dev en0"
+        mock_run.return_value = Mock(stdout=mock_output, returncode=0)
+
+        assert get_default_gateway() == "10.0.0.1"
+        mock_run.assert_called_once_with([_IP_BIN, "route"], capture_output=True)
+        mock_iproute.assert_not_called()
+
+    @patch("tftp_router_flasher.main._iproute")
+    def test_get_default_gateway_netlink_error(self, mock_iproute):
+        mock_iproute.return_value.get_default_routes.side_effect = NetlinkError(1)
+
+        assert get_default_gateway() == ""
+
+
+class TestResolveHost:
+    def setup_method(self):
+        """Run before each test method."""
+        pass
+
+    def teardown_method(self):
+        """Run after each test method."""
+        pass
+
+    @patch("tftp_router_flasher.main.socket.getaddrinfo")
+    def test_resolve_host_name(self, mock_getaddrinfo):
+        mock_getaddrinfo.return_value = [
+            (socket.AF_INET, socket.SOCK_DGRAM, 17, "", ("192.168.1.1", 69))
+        ]
+
+        assert resolve_host("router.local") == "192.168.1.1"
+        mock_getaddrinfo.assert_called_once_with(
+            "router.local", 69, socket.AF_INET, socket.SOCK_DGRAM
+        )
+
+    @patch("tftp_router_flasher.main.socket.getaddrinfo")
+    def test_resolve_host_unresolvable(self, mock_getaddrinfo):
+        mock_getaddrinfo.side_effect = socket.gaierror("Name or service not known")
+
+        assert resolve_host("router.local") == "router.local"
+
+    def test_resolve_host_literal(self):
+        assert resolve_host("192.168.1.1") == "192.168.1.1"
+
 
 class TestPrintConnectionInfo:
     def setup_method(self):
@@ -154,24 +330,104 @@ class TestPingHost:
         """Run after each test method."""
         pass
 
+    @patch("tftp_router_flasher.main._arp_resolves", return_value=False)
+    @patch("tftp_router_flasher.main._ping_socket", return_value=None)
     @patch("tftp_router_flasher.main.subprocess.run")
-    def test_ping_host_success(self, mock_run):
+    def test_ping_host_success(self, mock_run, mock_ping_socket, mock_arp_resolves):
         mock_run.return_value = Mock(returncode=0)
         logger = Mock()
 
         result = ping_host("192.168.1.1", False, logger)
         assert result is True
         mock_run.assert_called_once_with(
-            ["ping", "-c", "1", "192.168.1.1"], stdout=subprocess.DEVNULL
+            _ping_command("192.168.1.1"), stdout=subprocess.DEVNULL
         )
 
+    @patch("tftp_router_flasher.main.sys.platform", "linux")
+    def test_ping_command_linux(self):
+        # iputils: -W in seconds
+        assert _ping_command("192.168.1.1") == [
+            _PING_BIN,
+            "-c",
+            "1",
+            "-W",
+            "1",
+            "192.168.1.1",
+        ]
+
+    @patch("tftp_router_flasher.main.sys.platform", "darwin")
+    def test_ping_command_macos(self):
+        # BSD ping: -W in milliseconds, no -w deadline flag
+        assert _ping_command("192.168.1.1") == [
+            _PING_BIN,
+            "-c",
+            "1",
+            "-W",
+            "1000",
+            "192.168.1.1",
+        ]
+
+    @patch("tftp_router_flasher.main._arp_resolves", return_value=False)
+    @patch("tftp_router_flasher.main._ping_socket", return_value=None)
+    @patch("tftp_router_flasher.main.time.sleep")
     @patch("tftp_router_flasher.main.subprocess.run")
-    def test_ping_host_failure(self, mock_run):
+    def test_ping_host_failure(
+        self, mock_run, mock_sleep, mock_ping_socket, mock_arp_resolves
+    ):
         mock_run.return_value = Mock(returncode=1)
         logger = Mock()
 
         result = ping_host("192.168.1.1", False, logger)
         assert result is False
+        assert mock_run.call_count == 3
+
+    @patch("tftp_router_flasher.main._arp_resolves", return_value=False)
+    @patch("tftp_router_flasher.main._ping_socket", return_value=None)
+    @patch("tftp_router_flasher.main.random.uniform")
+    @patch("tftp_router_flasher.main.time.sleep")
+    @patch("tftp_router_flasher.main.subprocess.run")
+    def test_ping_host_backoff(
+        self, mock_run, mock_sleep, mock_uniform, mock_ping_socket, mock_arp_resolves
+    ):
+        mock_run.return_value = Mock(returncode=1)
+        mock_uniform.side_effect = lambda low, high: high
+        logger = Mock()
+
+        ping_host("192.168.1.1", False, logger, retries=6, base=0.1, cap=1.0)
+
+        # Full jitter: each sleep is drawn from [0, min(cap, base * 2**n)],
+        # and there is no sleep after the final attempt.
+        assert mock_uniform.call_args_list == [
+            call(0, 0.1),
+            call(0, 0.2),
+            call(0, 0.4),
+            call(0, 0.8),
+            call(0, 1.0),
+        ]
+        assert mock_sleep.call_count == 5
+
+    @patch("tftp_router_flasher.main._arp_resolves", return_value=False)
+    @patch("tftp_router_flasher.main._ping_socket", return_value=True)
+    @patch("tftp_router_flasher.main.subprocess.run")
+    def test_ping_host_socket(self, mock_run, mock_ping_socket, mock_arp_resolves):
+        logger = Mock()
+
+        result = ping_host("192.168.1.1", False, logger)
+        assert result is True
+        mock_ping_socket.assert_called_once_with("192.168.1.1", timeout=PING_TIMEOUT)
+        mock_run.assert_not_called()
+
+    @patch("tftp_router_flasher.main._ping_socket")
+    @patch("tftp_router_flasher.main.subprocess.run")
+    @patch("tftp_router_flasher.main._arp_resolves", return_value=True)
+    def test_ping_host_arp_hit(self, mock_arp_resolves, mock_run, mock_ping_socket):
+        logger = Mock()
+
+        result = ping_host("192.168.1.1", False, logger)
+        assert result is True
+        mock_arp_resolves.assert_called_once_with("192.168.1.1")
+        mock_ping_socket.assert_not_called()
+        mock_run.assert_not_called()
 
     @patch("tftp_router_flasher.main.subprocess.run")
     def test_ping_host_no_ping(self, mock_run):
@@ -182,6 +438,112 @@ class TestPingHost:
         mock_run.assert_not_called()
 
 
+@pytest.mark.usefixtures("netlink")
+class TestArpResolves:
+    def setup_method(self):
+        """Run before each test method."""
+        pass
+
+    def teardown_method(self):
+        """Run after each test method."""
+        pass
+
+    @patch("tftp_router_flasher.main._iproute")
+    def test_arp_resolves_reachable(self, mock_iproute):
+        ipr = mock_iproute.return_value
+        ipr.get_neighbours.return_value = (
+            _nlmsg({"NDA_LLADDR": "aa:bb:cc:dd:ee:ff"}, state=NUD_REACHABLE),
+        )
+
+        assert _arp_resolves("192.168.1.1") is True
+        ipr.get_neighbours.assert_called_once_with(
+            family=socket.AF_INET, dst="192.168.1.1"
+        )
+
+    @patch("tftp_router_flasher.main._iproute")
+    def test_arp_resolves_stale(self, mock_iproute):
+        mock_iproute.return_value.get_neighbours.return_value = (
+            _nlmsg({"NDA_LLADDR": "aa:bb:cc:dd:ee:ff"}, state=NUD_STALE),
+        )
+
+        assert _arp_resolves("192.168.1.1") is False
+
+    @patch("tftp_router_flasher.main._iproute")
+    def test_arp_resolves_incomplete(self, mock_iproute):
+        mock_iproute.return_value.get_neighbours.return_value = (
+            _nlmsg({}, state=NUD_REACHABLE),
+        )
+
+        assert _arp_resolves("192.168.1.1") is False
+
+    @patch("tftp_router_flasher.main._NETLINK", False)
+    @patch("tftp_router_flasher.main._iproute")
+    def test_arp_resolves_without_netlink(self, mock_iproute):
+        assert _arp_resolves("192.168.1.1") is False
+        mock_iproute.assert_not_called()
+
+    @patch("tftp_router_flasher.main._iproute")
+    def test_arp_resolves_netlink_error(self, mock_iproute):
+        mock_iproute.return_value.get_neighbours.side_effect = NetlinkError(1)
+
+        assert _arp_resolves("192.168.1.1") is False
+
+
+class TestPingSocket:
+    def setup_method(self):
+        """Run before each test method."""
+        pass
+
+    def teardown_method(self):
+        """Run after each test method."""
+        pass
+
+    def test_icmp_checksum(self):
+        # Echo request, identifier 0x1234, sequence 1
+        assert _icmp_checksum(b"\x08\x00\x00\x00\x12\x34\x00\x01") == 0xE5CA
+
+    @patch("tftp_router_flasher.main.socket.socket")
+    def test_ping_socket_reply(self, mock_socket):
+        sock = mock_socket.return_value
+        sock.recv.return_value = b"\x00\x00\x00\x00\x00\x00\x00\x01"
+
+        assert _ping_socket("192.168.1.1", 1.0) is True
+        mock_socket.assert_called_once_with(
+            socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP
+        )
+        sock.connect.assert_called_once_with(("192.168.1.1", 0))
+
+    @patch("tftp_router_flasher.main.os.getpid", return_value=0x1234)
+    @patch("tftp_router_flasher.main.socket.socket")
+    def test_ping_socket_raw_fallback(self, mock_socket, mock_getpid):
+        sock = Mock()
+        sock.__enter__ = Mock(return_value=sock)
+        sock.__exit__ = Mock(return_value=False)
+        mock_socket.side_effect = [PermissionError, sock]
+        ip_header = b"\x45" + b"\x00" * 19
+        sock.recv.side_effect = [
+            ip_header + b"\x08\x00\x00\x00\x12\x34\x00\x01",  # own request
+            ip_header + b"\x00\x00\x00\x00\x43\x21\x00\x01",  # other process
+            ip_header + b"\x00\x00\x00\x00\x12\x34\x00\x01",
+        ]
+
+        assert _ping_socket("192.168.1.1", 1.0) is True
+        assert sock.recv.call_count == 3
+
+    @patch("tftp_router_flasher.main.socket.socket")
+    def test_ping_socket_timeout(self, mock_socket):
+        sock = mock_socket.return_value
+        sock.recv.side_effect = TimeoutError
+
+        assert _ping_socket("192.168.1.1", 1.0) is False
+
+    @patch("tftp_router_flasher.main.socket.socket", side_effect=PermissionError)
+    def test_ping_socket_not_permitted(self, mock_socket):
+        assert _ping_socket("192.168.1.1", 1.0) is None
+        assert mock_socket.call_count == 2
+
+
+@pytest.mark.usefixtures("netlink")
 class TestConfigureInterface:
     def setup_method(self):
         """Run before each test method."""
@@ -191,103 +553,275 @@ class TestConfigureInterface:
         """Run after each test method."""
         pass
 
-    @patch("tftp_router_flasher.main.subprocess.run")
-    def test_configure_interface(self, mock_run):
+    @patch("tftp_router_flasher.main._iproute")
+    def test_configure_interface(self, mock_iproute):
+        mock_ipr = mock_iproute.return_value
+        mock_ipr.link_lookup.return_value = [3]
         logger = Mock()
 
         configure_interface("eth0", "192.168.1.10", "24", "192.168.1.1", logger)
 
+        mock_ipr.link_lookup.assert_called_once_with(ifname="eth0")
         expected_calls = [
-            call(["ip", "addr", "flush", "dev", "eth0"]),
-            call(["ip", "addr", "add", "192.168.1.10/24", "dev", "eth0"]),
-            call(["ip", "link", "set", "eth0", "up"]),
-            call(["ip", "route", "add", "default", "via", "192.168.1.1"]),
+            call.flush_addr(index=3),
+            call.addr("add", index=3, address="192.168.1.10", prefixlen=24),
+            call.link("set", index=3, state="up"),
+            call.route("add", dst="default", gateway="192.168.1.1"),
+        ]
+        mock_ipr.assert_has_calls(expected_calls)
+
+    @patch("tftp_router_flasher.main._iproute")
+    def test_configure_interface_route_exists(self, mock_iproute):
+        mock_ipr = mock_iproute.return_value
+        mock_ipr.link_lookup.return_value = [3]
+        mock_ipr.route.side_effect = NetlinkError(17, "File exists")
+        logger = Mock()
+
+        configure_interface("eth0", "192.168.1.10", "24", "192.168.1.1", logger)
+
+        mock_ipr.link.assert_called_once_with("set", index=3, state="up")
+        logger.warning.assert_not_called()
+
+    @patch("tftp_router_flasher.main._iproute")
+    def test_configure_interface_failure(self, mock_iproute):
+        mock_ipr = mock_iproute.return_value
+        mock_ipr.link_lookup.return_value = [3]
+        mock_ipr.addr.side_effect = NetlinkError(1, "Operation not permitted")
+        logger = Mock()
+
+        configure_interface("eth0", "192.168.1.10", "24", "192.168.1.1", logger)
+
+        logger.warning.assert_called_once()
+        mock_ipr.route.assert_not_called()
+
+    @patch("tftp_router_flasher.main._iproute")
+    def test_configure_interface_missing(self, mock_iproute):
+        mock_ipr = mock_iproute.return_value
+        mock_ipr.link_lookup.return_value = []
+        logger = Mock()
+
+        configure_interface("eth9", "192.168.1.10", "24", "192.168.1.1", logger)
+
+        logger.warning.assert_called_once()
+        mock_ipr.addr.assert_not_called()
+
+    @patch("tftp_router_flasher.main._NETLINK", False)
+    @patch("tftp_router_flasher.main._iproute")
+    @patch("tftp_router_flasher.main.subprocess.run")
+    def test_configure_interface_without_netlink(self, mock_run, mock_iproute):
+        logger = Mock()
+
+        configure_interface("en0", "192.168.1.10", "24", "192.168.1.1", logger)
+
+        assert mock_run.call_args_list == [
+            call([_IP_BIN, "addr", "flush", "dev", "en0"]),
+            call([_IP_BIN, "addr", "add", "192.168.1.10/24", "dev", "en0"]),
+            call([_IP_BIN, "link", "set", "en0", "up"]),
+            call([_IP_BIN, "route", "add", "default", "via", "192.168.1.1"]),
         ]
-        mock_run.assert_has_calls(expected_calls)
+        mock_iproute.assert_not_called()
 
 
 class TestUploadBinaryUsingTFTP:
     def setup_method(self):
         """Run before each test method."""
-        pass
+        _FW_SIZE_CACHE.clear()
 
     def teardown_method(self):
         """Run after each test method."""
-        pass
+        _FW_SIZE_CACHE.clear()
 
-    @patch("tftp_router_flasher.main.tftpy.TftpClient")
-    def test_upload_binary_success(self, mock_tftp_client):
-        mock_client = Mock()
-        mock_tftp_client.return_value = mock_client
+    @patch("tftp_router_flasher.main.windowed.upload")
+    def test_upload_binary_success(self, mock_upload, sample_firmware_file):
+        uploaded = []
+        mock_upload.side_effect = lambda host, name, image, *args, **kwargs: (
+            uploaded.append((host, name, bytes(image), args, kwargs))
+        )
         logger = Mock()
 
         result = upload_binary_using_tftp(
-            "192.168.1.1", "/path/to/firmware.bin", 120, logger
+            "192.168.1.1", sample_firmware_file, 120, logger
         )
 
         assert result is True
-        mock_tftp_client.assert_called_once_with("192.168.1.1", 69)
-        mock_client.upload.assert_called_once_with(
-            "firmware.bin", "/path/to/firmware.bin", timeout=120
+        assert uploaded == [
+            (
+                "192.168.1.1",
+                os.path.basename(sample_firmware_file),
+                b"fake firmware content",
+                (TFTP_BLKSIZE, 1, 120, logger),
+                {"tsize": None},
+            )
+        ]
+
+    @patch("tftp_router_flasher.main.windowed.upload")
+    def test_upload_binary_sends_validated_size(
+        self, mock_upload, sample_firmware_file
+    ):
+        assert _firmware_arg(sample_firmware_file) == sample_firmware_file
+
+        with patch("tftp_router_flasher.main.os.stat") as mock_stat:
+            result = upload_binary_using_tftp(
+                "192.168.1.1", sample_firmware_file, 120, Mock()
+            )
+
+        assert result is True
+        mock_stat.assert_not_called()
+        assert mock_upload.call_args.kwargs == {"tsize": len(b"fake firmware content")}
+
+    @patch("tftp_router_flasher.main.windowed.upload")
+    def test_upload_binary_windowed(self, mock_upload, sample_firmware_file):
+        logger = Mock()
+
+        result = upload_binary_using_tftp(
+            "192.168.1.1", sample_firmware_file, 120, logger, 16
         )
 
-    @patch("tftp_router_flasher.main.tftpy.TftpClient")
-    def test_upload_binary_failure(self, mock_tftp_client):
-        mock_tftp_client.side_effect = Exception("Connection failed")
+        assert result is True
+        assert mock_upload.call_args.args[3:] == (TFTP_BLKSIZE, 16, 120, logger)
+
+    def test_upload_binary_options_ignored(self, tmp_path):
+        firmware = tmp_path / "firmware.bin"
+        data = bytes(range(256)) * 22  # 11 blocks of 512
+        firmware.write_bytes(data)
+        server = FakeWindowServer(None)
+        server.start()
+        upload = functools.partial(windowed.upload, port=server.port, retransmit=0.05)
+
+        with patch("tftp_router_flasher.main.windowed.upload", upload):
+            result = upload_binary_using_tftp("127.0.0.1", str(firmware), 5, Mock())
+        server.join(5)
+
+        assert result is True
+        assert bytes(server.data) == data
+        assert server.acks == 12  # lock-step 512-byte blocks, last one empty
+
+    def test_mapped_firmware(self, sample_firmware_file):
+        with _MappedFirmware(sample_firmware_file) as image:
+            assert image.buffer[:] == b"fake firmware content"
+        assert image.buffer.closed
+
+    @patch("tftp_router_flasher.main.windowed.upload")
+    def test_upload_binary_failure(self, mock_upload, sample_firmware_file):
+        mock_upload.side_effect = windowed.TFTPError("Connection failed")
         logger = Mock()
 
         result = upload_binary_using_tftp(
-            "192.168.1.1", "/path/to/firmware.bin", 120, logger
+            "192.168.1.1", sample_firmware_file, 120, logger
         )
 
         assert result is False
         logger.error.assert_called_once_with("TFTP upload failed: Connection failed")
 
 
-class TestValidateFirmwarePath:
+class TestFirmwareArg:
     def setup_method(self):
         """Run before each test method."""
-        pass
+        _FW_SIZE_CACHE.clear()
 
     def teardown_method(self):
         """Run after each test method."""
+        _FW_SIZE_CACHE.clear()
+
+    @patch("tftp_router_flasher.main.os.access")
+    @patch("tftp_router_flasher.main.os.stat")
+    def test_firmware_arg_exists(self, mock_stat, mock_access):
+        mock_stat.return_value = Mock(st_mode=stat.S_IFREG | 0o644, st_size=123)
+        mock_access.return_value = True
+
+        assert _firmware_arg("/path/to/firmware.bin") == "/path/to/firmware.bin"
+        mock_access.assert_called_once_with("/path/to/firmware.bin", os.R_OK)
+        assert _FW_SIZE_CACHE == {"/path/to/firmware.bin": 123}
+
+    @patch("tftp_router_flasher.main.os.stat")
+    def test_firmware_arg_not_exists(self, mock_stat):
+        mock_stat.side_effect = FileNotFoundError
+
+        with pytest.raises(argparse.ArgumentTypeError) as exc_info:
+            _firmware_arg("/path/to/firmware.bin")
+        assert str(exc_info.value) == "Invalid firmware path: /path/to/firmware.bin"
+
+    @patch("tftp_router_flasher.main.os.stat")
+    def test_firmware_arg_directory(self, mock_stat):
+        mock_stat.return_value = Mock(st_mode=stat.S_IFDIR | 0o755)
+
+        with pytest.raises(argparse.ArgumentTypeError) as exc_info:
+            _firmware_arg("/path/to")
+        assert str(exc_info.value) == "Invalid firmware path: /path/to"
+        assert _FW_SIZE_CACHE == {}
+
+    @patch("tftp_router_flasher.main.os.access")
+    @patch("tftp_router_flasher.main.os.stat")
+    def test_firmware_arg_not_readable(self, mock_stat, mock_access):
+        mock_stat.return_value = Mock(st_mode=stat.S_IFREG | 0o200, st_size=123)
+        mock_access.return_value = False
+
+        with pytest.raises(argparse.ArgumentTypeError) as exc_info:
+            _firmware_arg("/path/to/firmware.bin")
+        assert (
+            str(exc_info.value)
+            == "Firmware file is not readable: /path/to/firmware.bin"
+        )
+
+    def test_firmware_arg_empty(self, tmp_path):
+        firmware = tmp_path / "firmware.bin"
+        firmware.touch()
+
+        with pytest.raises(argparse.ArgumentTypeError) as exc_info:
+            _firmware_arg(str(firmware))
+        assert str(exc_info.value) == f"Firmware file is empty: {firmware}"
+        assert _FW_SIZE_CACHE == {}
+
+
+class TestWindowsizeArg:
+    def setup_method(self):
+        """Run before each test method."""
         pass
 
-    @patch("tftp_router_flasher.main.os.path.isfile")
-    def test_validate_firmware_path_exists(self, mock_isfile):
-        mock_isfile.return_value = True
-        logger = Mock()
+    def teardown_method(self):
+        """Run after each test method."""
+        pass
 
-        result = validate_firmware_path("/path/to/firmware.bin", logger)
-        assert result is True
+    def test_windowsize_arg_valid(self):
+        assert _windowsize_arg("16") == 16
 
-    @patch("tftp_router_flasher.main.os.path.isfile")
-    def test_validate_firmware_path_not_exists(self, mock_isfile):
-        mock_isfile.return_value = False
-        logger = Mock()
+    @pytest.mark.parametrize("value", ["0", "65536", "-1"])
+    def test_windowsize_arg_out_of_range(self, value):
+        with pytest.raises(argparse.ArgumentTypeError, match="between 1 and 65535"):
+            _windowsize_arg(value)
 
-        result = validate_firmware_path("/path/to/firmware.bin", logger)
-        assert result is False
-        logger.error.assert_called_once_with(
-            "Invalid firmware path: /path/to/firmware.bin"
-        )
+    def test_windowsize_arg_not_int(self):
+        with pytest.raises(argparse.ArgumentTypeError, match="invalid int value"):
+            _windowsize_arg("eight")
 
 
 class TestTryDefaultIPRange:
     def setup_method(self):
         """Run before each test method."""
-        pass
+        # Keep the last-success cache out of the real home directory
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"XDG_CACHE_HOME": self.cache_dir.name})
+        self.env.start()
 
     def teardown_method(self):
         """Run after each test method."""
-        pass
+        self.env.stop()
+        self.cache_dir.cleanup()
 
+    @patch("tftp_router_flasher.main._arp_resolves", return_value=False)
+    @patch("tftp_router_flasher.main._arp_probe", return_value=None)
     @patch("tftp_router_flasher.main.upload_binary_using_tftp")
     @patch("tftp_router_flasher.main.ping_host")
     @patch("tftp_router_flasher.main.configure_interface")
-    @patch("tftp_router_flasher.main.time.sleep")
+    @patch("tftp_router_flasher.main._wait_for_link_up")
     def test_try_default_ip_range_success(
-        self, mock_sleep, mock_configure, mock_ping, mock_upload
+        self,
+        mock_wait,
+        mock_configure,
+        mock_ping,
+        mock_upload,
+        mock_arp,
+        mock_arp_resolves,
     ):
         mock_ping.return_value = True
         mock_upload.return_value = True
@@ -298,14 +832,24 @@ class TestTryDefaultIPRange:
         assert result is True
         mock_configure.assert_called()
         mock_ping.assert_called_with("192.168.1.1", False, logger)
-        mock_upload.assert_called_once_with("192.168.1.1", "/firmware.bin", 120, logger)
+        mock_upload.assert_called_once_with(
+            "192.168.1.1", "/firmware.bin", 120, logger, 1
+        )
 
+    @patch("tftp_router_flasher.main._arp_resolves", return_value=False)
+    @patch("tftp_router_flasher.main._arp_probe", return_value=None)
     @patch("tftp_router_flasher.main.upload_binary_using_tftp")
     @patch("tftp_router_flasher.main.ping_host")
     @patch("tftp_router_flasher.main.configure_interface")
-    @patch("tftp_router_flasher.main.time.sleep")
+    @patch("tftp_router_flasher.main._wait_for_link_up")
     def test_try_default_ip_range_failure(
-        self, mock_sleep, mock_configure, mock_ping, mock_upload
+        self,
+        mock_wait,
+        mock_configure,
+        mock_ping,
+        mock_upload,
+        mock_arp,
+        mock_arp_resolves,
     ):
         mock_ping.return_value = False  # No router responds
         logger = Mock()
@@ -316,6 +860,300 @@ class TestTryDefaultIPRange:
         assert mock_configure.call_count == 24  # Tries all 24 IPs
         mock_upload.assert_not_called()
 
+    @patch("tftp_router_flasher.main._arp_probe", return_value="192.168.1.7")
+    @patch("tftp_router_flasher.main.upload_binary_using_tftp")
+    @patch("tftp_router_flasher.main.ping_host")
+    @patch("tftp_router_flasher.main.configure_interface")
+    @patch("tftp_router_flasher.main._wait_for_link_up")
+    def test_try_default_ip_range_arp_hit(
+        self, mock_wait, mock_configure, mock_ping, mock_upload, mock_arp
+    ):
+        mock_ping.return_value = True
+        mock_upload.return_value = True
+        logger = Mock()
+
+        result = try_default_ip_range("eth0", "/firmware.bin", 120, False, logger)
+
+        assert result is True
+        mock_configure.assert_called_once_with(
+            "eth0", "192.168.1.7", "24", "192.168.1.1", logger
+        )
+
+    @patch("tftp_router_flasher.main.get_ip_info", return_value=("192.168.1.9", "24"))
+    @patch("tftp_router_flasher.main._arp_resolves", return_value=True)
+    @patch("tftp_router_flasher.main._arp_probe", return_value=None)
+    @patch("tftp_router_flasher.main.upload_binary_using_tftp")
+    @patch("tftp_router_flasher.main.ping_host")
+    @patch("tftp_router_flasher.main.configure_interface")
+    @patch("tftp_router_flasher.main._wait_for_link_up")
+    def test_try_default_ip_range_router_in_arp_table(
+        self,
+        mock_wait,
+        mock_configure,
+        mock_ping,
+        mock_upload,
+        mock_arp,
+        mock_arp_resolves,
+        mock_get_ip_info,
+    ):
+        mock_ping.return_value = True
+        mock_upload.return_value = True
+        logger = Mock()
+
+        result = try_default_ip_range("eth0", "/firmware.bin", 120, False, logger)
+
+        assert result is True
+        mock_arp_resolves.assert_called_once_with("192.168.1.1")
+        mock_configure.assert_called_once_with(
+            "eth0", "192.168.1.9", "24", "192.168.1.1", logger
+        )
+
+    @patch("tftp_router_flasher.main._arp_resolves", return_value=False)
+    @patch("tftp_router_flasher.main._arp_probe", return_value=None)
+    @patch("tftp_router_flasher.main.upload_binary_using_tftp")
+    @patch("tftp_router_flasher.main.ping_host")
+    @patch("tftp_router_flasher.main.configure_interface")
+    @patch("tftp_router_flasher.main._wait_for_link_up")
+    def test_try_default_ip_range_uses_cache(
+        self,
+        mock_wait,
+        mock_configure,
+        mock_ping,
+        mock_upload,
+        mock_arp,
+        mock_arp_resolves,
+    ):
+        # Only the address that worked last time gets an answer
+        mock_ping.side_effect = lambda *args: (
+            mock_configure.call_args[0][1] == "192.168.1.17"
+        )
+        mock_upload.return_value = True
+        logger = Mock()
+
+        assert try_default_ip_range("eth0", "/firmware.bin", 120, False, logger)
+        assert mock_configure.call_count == 16
+        assert _load_last_success() == "192.168.1.17"
+
+        mock_configure.reset_mock()
+        assert try_default_ip_range("eth0", "/firmware.bin", 120, False, logger)
+        assert mock_configure.call_count == 1
+
+    @patch("tftp_router_flasher.main._arp_resolves", return_value=False)
+    @patch("tftp_router_flasher.main._arp_probe", return_value=None)
+    @patch("tftp_router_flasher.main.upload_binary_using_tftp")
+    @patch("tftp_router_flasher.main.ping_host")
+    @patch("tftp_router_flasher.main.configure_interface")
+    @patch("tftp_router_flasher.main._wait_for_link_up")
+    def test_try_default_ip_range_ignores_bad_cache(
+        self,
+        mock_wait,
+        mock_configure,
+        mock_ping,
+        mock_upload,
+        mock_arp,
+        mock_arp_resolves,
+    ):
+        path = _last_success_path()
+        os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write("10.0.0.1\n")
+        mock_ping.return_value = True
+        mock_upload.return_value = False
+        logger = Mock()
+
+        result = try_default_ip_range("eth0", "/firmware.bin", 120, False, logger)
+
+        assert result is False
+        mock_configure.assert_called_once_with(
+            "eth0", "192.168.1.2", "24", "192.168.1.1", logger
+        )
+        # A failed upload does not overwrite the cache
+        with open(path) as f:
+            assert f.read() == "10.0.0.1\n"
+
+    @patch("tftp_router_flasher.main.os.replace", side_effect=PermissionError)
+    def test_save_last_success_ignores_errors(self, mock_replace):
+        _save_last_success("192.168.1.5")
+
+        assert _load_last_success() is None
+        assert os.listdir(os.path.dirname(_last_success_path())) == []
+
+    def test_save_last_success_under_sudo(self):
+        home = self.cache_dir.name
+        if os.geteuid() == 0:
+            os.chown(home, 4242, 4242)  # stand in for the invoking user
+        st = os.stat(home)
+        cache = os.path.join(home, ".cache")
+        env = {
+            "XDG_CACHE_HOME": cache,
+            "SUDO_UID": str(st.st_uid),
+            "SUDO_GID": str(st.st_gid),
+        }
+
+        with (
+            patch.dict(os.environ, env),
+            patch("tftp_router_flasher.main.os.geteuid", return_value=0),
+            patch("tftp_router_flasher.main.os.chown", wraps=os.chown) as chown,
+        ):
+            _save_last_success("192.168.1.5")
+            path = _last_success_path()
+
+        assert [c.args[1:] for c in chown.call_args_list] == [
+            (st.st_uid, st.st_gid)
+        ] * 3
+        for entry in (cache, os.path.dirname(path), path):
+            assert (os.stat(entry).st_uid, os.stat(entry).st_gid) == (
+                st.st_uid,
+                st.st_gid,
+            )
+
+    def test_save_last_success_skips_foreign_home(self):
+        home = self.cache_dir.name
+        if os.geteuid() == 0:
+            os.chown(home, 4242, 4242)  # another user's home, sudo not used
+        cache = os.path.join(home, ".cache")
+
+        with (
+            patch.dict(os.environ, {"XDG_CACHE_HOME": cache}),
+            patch("tftp_router_flasher.main.os.geteuid", return_value=0),
+        ):
+            os.environ.pop("SUDO_UID", None)
+            _save_last_success("192.168.1.5")
+
+        assert not os.path.exists(cache)
+
+
+@pytest.mark.usefixtures("netlink")
+class TestWaitForLinkUp:
+    def setup_method(self):
+        """Run before each test method."""
+        pass
+
+    def teardown_method(self):
+        """Run after each test method."""
+        pass
+
+    def _link(self, state, index=3, event="RTM_NEWLINK"):
+        link = Mock()
+        link.get.return_value = event
+        link.__getitem__ = Mock(return_value=index)
+        link.get_attr.return_value = state
+        return link
+
+    @patch("tftp_router_flasher.main.select.select")
+    @patch("tftp_router_flasher.main._iproute")
+    @patch("tftp_router_flasher.main.IPRoute")
+    def test_wait_for_link_up_already_up(self, mock_ipr_cls, mock_iproute, mock_select):
+        mock_iproute.return_value.link_lookup.return_value = [3]
+        mock_iproute.return_value.get_links.return_value = [self._link("UP")]
+
+        assert _wait_for_link_up("eth0", 2.0) is True
+        mock_select.assert_not_called()
+
+    @patch("tftp_router_flasher.main.select.select")
+    @patch("tftp_router_flasher.main._iproute")
+    @patch("tftp_router_flasher.main.IPRoute")
+    def test_wait_for_link_up_event(self, mock_ipr_cls, mock_iproute, mock_select):
+        events = mock_ipr_cls.return_value.__enter__.return_value
+        mock_iproute.return_value.link_lookup.return_value = [3]
+        mock_iproute.return_value.get_links.return_value = [self._link("DOWN")]
+        mock_select.return_value = ([events], [], [])
+        events.get.side_effect = [
+            [self._link("UP", index=7)],
+            [self._link("UP")],
+        ]
+
+        assert _wait_for_link_up("eth0", 2.0) is True
+        events.bind.assert_called_once_with(groups=RTMGRP_LINK)
+        assert events.get.call_count == 2
+
+    @patch("tftp_router_flasher.main.select.select")
+    @patch("tftp_router_flasher.main._iproute")
+    @patch("tftp_router_flasher.main.IPRoute")
+    def test_wait_for_link_up_timeout(self, mock_ipr_cls, mock_iproute, mock_select):
+        mock_iproute.return_value.link_lookup.return_value = [3]
+        mock_iproute.return_value.get_links.return_value = [self._link("DOWN")]
+        mock_select.return_value = ([], [], [])
+
+        assert _wait_for_link_up("eth0", 2.0) is False
+
+    @patch("tftp_router_flasher.main._iproute")
+    @patch("tftp_router_flasher.main.IPRoute")
+    def test_wait_for_link_up_netlink_error(self, mock_ipr_cls, mock_iproute):
+        mock_iproute.return_value.link_lookup.return_value = [3]
+        mock_iproute.return_value.get_links.side_effect = NetlinkError(19)
+
+        assert _wait_for_link_up("eth0", 2.0) is False
+
+    @patch("tftp_router_flasher.main.IPRoute", side_effect=OSError)
+    def test_wait_for_link_up_no_socket(self, mock_ipr_cls):
+        assert _wait_for_link_up("eth0", 2.0) is False
+
+    @patch("tftp_router_flasher.main._NETLINK", False)
+    @patch("tftp_router_flasher.main.time.sleep")
+    @patch("tftp_router_flasher.main.IPRoute")
+    def test_wait_for_link_up_without_netlink(self, mock_ipr_cls, mock_sleep):
+        assert _wait_for_link_up("en0", 2.0) is True
+        mock_sleep.assert_called_once_with(2.0)
+        mock_ipr_cls.assert_not_called()
+
+
+class TestArpProbe:
+    def setup_method(self):
+        """Run before each test method."""
+        self.mac = b"\x02\x00\x00\x00\x00\x01"
+        self.router_mac = b"\x02\x00\x00\x00\x00\xfe"
+        self.candidates = tuple(f"192.168.1.{i}" for i in range(2, 26))
+
+    def teardown_method(self):
+        """Run after each test method."""
+        pass
+
+    def _reply(self, local_ip):
+        return _ARP_FRAME.pack(
+            self.mac,
+            self.router_mac,
+            ETH_P_ARP,
+            1,
+            0x0800,
+            6,
+            4,
+            2,
+            self.router_mac,
+            socket.inet_aton("192.168.1.1"),
+            self.mac,
+            socket.inet_aton(local_ip),
+        )
+
+    @patch("tftp_router_flasher.main.socket.socket")
+    def test_arp_probe_reply(self, mock_socket):
+        sock = mock_socket.return_value
+        sock.getsockname.return_value = ("eth0", ETH_P_ARP, 0, 1, self.mac)
+        sock.recv.side_effect = [b"short", self._reply("192.168.1.5")]
+
+        result = _arp_probe("eth0", "192.168.1.1", self.candidates)
+
+        assert result == "192.168.1.5"
+        assert sock.send.call_count == 24
+        request = _ARP_FRAME.unpack(sock.send.call_args_list[0].args[0])
+        assert request[0] == b"\xff" * 6
+        assert request[9] == socket.inet_aton("192.168.1.2")
+        assert request[11] == socket.inet_aton("192.168.1.1")
+
+    @patch("tftp_router_flasher.main.socket.socket")
+    def test_arp_probe_timeout(self, mock_socket):
+        sock = mock_socket.return_value
+        sock.getsockname.return_value = ("eth0", ETH_P_ARP, 0, 1, self.mac)
+        sock.recv.side_effect = TimeoutError
+
+        assert _arp_probe("eth0", "192.168.1.1", self.candidates) is None
+
+    @patch("tftp_router_flasher.main.socket.socket")
+    def test_arp_probe_no_raw_socket(self, mock_socket):
+        mock_socket.side_effect = PermissionError
+
+        assert _arp_probe("eth0", "192.168.1.1", self.candidates) is None
+
 
 class TestUploadFirmware:
     def setup_method(self):
@@ -346,7 +1184,36 @@ class TestUploadFirmware:
 
         assert result is True
         mock_ping.assert_called_once_with("192.168.1.1", False, logger)
-        mock_upload.assert_called_once_with("192.168.1.1", "/firmware.bin", 120, logger)
+        mock_upload.assert_called_once_with(
+            "192.168.1.1", "/firmware.bin", 120, logger, 1
+        )
+
+    @patch("tftp_router_flasher.main.resolve_host")
+    @patch("tftp_router_flasher.main.upload_binary_using_tftp")
+    @patch("tftp_router_flasher.main.ping_host")
+    @patch("tftp_router_flasher.main.get_default_gateway")
+    @patch("tftp_router_flasher.main.get_ip_info")
+    @patch("tftp_router_flasher.main.print_connection_info")
+    def test_upload_firmware_resolves_hostname(
+        self, mock_print, mock_get_ip, mock_get_gw, mock_ping, mock_upload, mock_resolve
+    ):
+        mock_get_ip.return_value = ("192.168.1.10", "24")
+        mock_get_gw.return_value = "192.168.1.1"
+        mock_resolve.return_value = "192.168.1.1"
+        mock_ping.return_value = True
+        mock_upload.return_value = True
+        logger = Mock()
+
+        result = upload_firmware(
+            "router.local", "eth0", "/firmware.bin", 120, False, logger
+        )
+
+        assert result is True
+        mock_resolve.assert_called_once_with("router.local")
+        mock_ping.assert_called_once_with("192.168.1.1", False, logger)
+        mock_upload.assert_called_once_with(
+            "192.168.1.1", "/firmware.bin", 120, logger, 1
+        )
 
     @patch("builtins.input")  # Changed from tftp_router_flasher.main.builtins.input
     @patch("tftp_router_flasher.main.try_default_ip_range")
@@ -376,7 +1243,7 @@ class TestUploadFirmware:
 
         assert result is True
         mock_try_range.assert_called_once_with(
-            "eth0", "/firmware.bin", 120, False, logger
+            "eth0", "/firmware.bin", 120, False, logger, 1
         )
 
     @patch("builtins.input")  # Changed from tftp_router_flasher.main.builtins.input
@@ -418,7 +1285,7 @@ class TestMain:
         pass
 
     @patch("tftp_router_flasher.main.upload_firmware")
-    @patch("tftp_router_flasher.main.validate_firmware_path")
+    @patch("tftp_router_flasher.main._firmware_error")
     @patch("tftp_router_flasher.main.validate_interface")
     @patch("tftp_router_flasher.main.setup_logger")
     @patch("tftp_router_flasher.main.sys.exit")
@@ -427,12 +1294,12 @@ class TestMain:
         mock_exit,
         mock_setup_logger,
         mock_validate_interface,
-        mock_validate_firmware,
+        mock_firmware_error,
         mock_upload,
     ):
         mock_setup_logger.return_value = Mock()
         mock_validate_interface.return_value = True
-        mock_validate_firmware.return_value = True
+        mock_firmware_error.return_value = None
         mock_upload.return_value = True
 
         test_args = [
@@ -452,19 +1319,19 @@ class TestMain:
         mock_exit.assert_not_called()
 
     @patch("tftp_router_flasher.main.upload_firmware")
-    @patch("tftp_router_flasher.main.validate_firmware_path")
+    @patch("tftp_router_flasher.main._firmware_error")
     @patch("tftp_router_flasher.main.validate_interface")
     @patch("tftp_router_flasher.main.setup_logger")
     def test_main_invalid_interface(
         self,
         mock_setup_logger,
         mock_validate_interface,
-        mock_validate_firmware,
+        mock_firmware_error,
         mock_upload,
     ):
         mock_setup_logger.return_value = Mock()
         mock_validate_interface.return_value = False
-        mock_validate_firmware.return_value = True
+        mock_firmware_error.return_value = None
 
         test_args = [
             "tftp_router_flasher.py",
@@ -478,24 +1345,25 @@ class TestMain:
             with pytest.raises(SystemExit) as exc_info:
                 main()
 
-        # Check that it exited with code 1
-        assert exc_info.value.code == 1
+        # Rejected by argparse before the log file is opened
+        assert exc_info.value.code == 2
+        mock_setup_logger.assert_not_called()
         mock_upload.assert_not_called()
 
     @patch("tftp_router_flasher.main.upload_firmware")
-    @patch("tftp_router_flasher.main.validate_firmware_path")
+    @patch("tftp_router_flasher.main._firmware_error")
     @patch("tftp_router_flasher.main.validate_interface")
     @patch("tftp_router_flasher.main.setup_logger")
     def test_main_invalid_firmware(
         self,
         mock_setup_logger,
         mock_validate_interface,
-        mock_validate_firmware,
+        mock_firmware_error,
         mock_upload,
     ):
         mock_setup_logger.return_value = Mock()
         mock_validate_interface.return_value = True
-        mock_validate_firmware.return_value = False
+        mock_firmware_error.return_value = "Invalid firmware path: /nonexistent.bin"
 
         test_args = [
             "tftp_router_flasher.py",
@@ -509,24 +1377,25 @@ class TestMain:
             with pytest.raises(SystemExit) as exc_info:
                 main()
 
-        # Check that it exited with code 1
-        assert exc_info.value.code == 1
+        # Rejected by argparse before the log file is opened
+        assert exc_info.value.code == 2
+        mock_setup_logger.assert_not_called()
         mock_upload.assert_not_called()
 
     @patch("tftp_router_flasher.main.upload_firmware")
-    @patch("tftp_router_flasher.main.validate_firmware_path")
+    @patch("tftp_router_flasher.main._firmware_error")
     @patch("tftp_router_flasher.main.validate_interface")
     @patch("tftp_router_flasher.main.setup_logger")
     def test_main_upload_failed(
         self,
         mock_setup_logger,
         mock_validate_interface,
-        mock_validate_firmware,
+        mock_firmware_error,
         mock_upload,
     ):
         mock_setup_logger.return_value = Mock()
         mock_validate_interface.return_value = True
-        mock_validate_firmware.return_value = True
+        mock_firmware_error.return_value = None
         mock_upload.return_value = False
 
         test_args = [
@@ -544,6 +1413,37 @@ class TestMain:
         # Check that it exited with code 1
         assert exc_info.value.code == 1
 
+    @patch("tftp_router_flasher.main.upload_firmware")
+    @patch("tftp_router_flasher.main._firmware_error", return_value=None)
+    @patch("tftp_router_flasher.main.validate_interface", return_value=True)
+    @patch("tftp_router_flasher.main.setup_logger")
+    def test_main_invalid_windowsize(
+        self,
+        mock_setup_logger,
+        mock_validate_interface,
+        mock_firmware_error,
+        mock_upload,
+        capsys,
+    ):
+        test_args = [
+            "tftp_router_flasher.py",
+            "--firmware",
+            "/firmware.bin",
+            "--interface",
+            "eth0",
+            "--windowsize",
+            "0",
+        ]
+
+        with patch("sys.argv", test_args):
+            with pytest.raises(SystemExit) as exc_info:
+                main()
+
+        assert exc_info.value.code == 2
+        assert "argument --windowsize: must be between 1 and" in capsys.readouterr().err
+        mock_setup_logger.assert_not_called()
+        mock_upload.assert_not_called()
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,206 @@
+import socket
+import struct
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from tftp_router_flasher.windowed import TFTPError, _parse_oack, _wrq, upload
+
+
+class FakeWindowServer(threading.Thread):
+    """Minimal RFC 7440 receiver for a single upload on localhost."""
+
+    def __init__(self, options=None, drop=(), error=None):
+        super().__init__(daemon=True)
+        self.options = options  # None: ignore options and ACK block 0
+        self.drop = set(drop)  # absolute block numbers lost once
+        self.error = error
+        self.data = bytearray()
+        self.acks = 0
+        self.request = None
+        self.listen = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listen.bind(("127.0.0.1", 0))
+        self.listen.settimeout(5)
+        self.port = self.listen.getsockname()[1]
+
+    def run(self):
+        packet, client = self.listen.recvfrom(65536)
+        self.request = packet
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(("127.0.0.1", 0))
+            sock.settimeout(5)
+            if self.error:
+                sock.sendto(struct.pack("!HH", 5, 2) + self.error + b"\0", client)
+                return
+            if self.options is None:
+                blksize, windowsize = 512, 1
+                sock.sendto(struct.pack("!HH", 4, 0), client)
+            else:
+                blksize = int(self.options.get("blksize", 512))
+                windowsize = int(self.options.get("windowsize", 1))
+                body = b"".join(
+                    k.encode() + b"\0" + str(v).encode() + b"\0"
+                    for k, v in self.options.items()
+                )
+                sock.sendto(struct.pack("!H", 6) + body, client)
+            expected = 1
+            received = 0
+            while True:
+                packet = sock.recv(65536)
+                _, number = struct.unpack_from("!HH", packet)
+                if expected in self.drop:
+                    self.drop.discard(expected)
+                    continue
+                if number != expected & 0xFFFF:
+                    self._ack(sock, client, expected - 1)
+                    received = 0
+                    continue
+                self.data += packet[4:]
+                expected += 1
+                received += 1
+                if len(packet) - 4 < blksize:
+                    self._ack(sock, client, expected - 1)
+                    return
+                if received == windowsize:
+                    self._ack(sock, client, expected - 1)
+                    received = 0
+
+    def _ack(self, sock, client, block):
+        self.acks += 1
+        sock.sendto(struct.pack("!HH", 4, block & 0xFFFF), client)
+
+
+def _upload(server, data, blksize=512, windowsize=8, timeout=5):
+    server.start()
+    upload(
+        "127.0.0.1",
+        "firmware.bin",
+        data,
+        blksize,
+        windowsize,
+        timeout,
+        Mock(),
+        port=server.port,
+        retransmit=0.05,
+    )
+    server.join(5)
+
+
+class TestPackets:
+    def setup_method(self):
+        """Run before each test method."""
+        pass
+
+    def teardown_method(self):
+        """Run after each test method."""
+        pass
+
+    def test_wrq(self):
+        packet = _wrq("fw.bin", {"blksize": 1468, "windowsize": 8})
+        assert packet == b"\0\2fw.bin\0octet\0blksize\x001468\0windowsize\x008\0"
+
+    def test_parse_oack(self):
+        packet = b"\0\6BLKSIZE\x001024\0windowsize\x004\0"
+        assert _parse_oack(packet) == {"blksize": "1024", "windowsize": "4"}
+
+
+class TestUpload:
+    def setup_method(self):
+        """Run before each test method."""
+        self.data = bytes(range(256)) * 22  # 5632 bytes, 11 blocks of 512
+
+    def teardown_method(self):
+        """Run after each test method."""
+        pass
+
+    def test_upload_windowed(self):
+        server = FakeWindowServer({"blksize": 512, "windowsize": 4})
+        _upload(server, self.data)
+
+        assert bytes(server.data) == self.data
+        assert server.acks == 3  # 12 blocks (last one empty) in windows of 4
+        assert b"windowsize\x008\0" in server.request
+
+    def test_upload_size_multiple_of_blksize(self):
+        server = FakeWindowServer({"blksize": 512, "windowsize": 4})
+        _upload(server, self.data[:4096])
+
+        assert bytes(server.data) == self.data[:4096]
+
+    def test_upload_options_ignored(self):
+        server = FakeWindowServer(None)
+        _upload(server, self.data, blksize=1468)
+
+        assert bytes(server.data) == self.data
+        assert server.acks == 12  # lock-step, one ACK per block
+
+    def test_upload_tsize(self):
+        server = FakeWindowServer({"blksize": 512, "windowsize": 4})
+        server.start()
+        upload(
+            "127.0.0.1",
+            "firmware.bin",
+            self.data,
+            512,
+            4,
+            5,
+            Mock(),
+            port=server.port,
+            retransmit=0.05,
+            tsize=len(self.data),
+        )
+        server.join(5)
+
+        assert bytes(server.data) == self.data
+        assert b"tsize\x005632\0" in server.request
+
+    def test_upload_smaller_blksize_accepted(self):
+        server = FakeWindowServer({"blksize": 1024, "windowsize": 2})
+        _upload(server, self.data, blksize=1468)
+
+        assert bytes(server.data) == self.data
+
+    def test_upload_lost_block_mid_window(self):
+        server = FakeWindowServer({"blksize": 512, "windowsize": 4}, drop={6})
+        _upload(server, self.data)
+
+        assert bytes(server.data) == self.data
+
+    def test_upload_lost_first_block_of_window(self):
+        server = FakeWindowServer({"blksize": 512, "windowsize": 4}, drop={5})
+        _upload(server, self.data)
+
+        assert bytes(server.data) == self.data
+
+    def test_upload_block_number_wraps(self):
+        data = bytes(range(256)) * 2200  # 70400 blocks of 8 bytes
+        server = FakeWindowServer({"blksize": 8, "windowsize": 64})
+        _upload(server, data, blksize=8, windowsize=64)
+
+        assert bytes(server.data) == data
+
+    def test_upload_server_error(self):
+        server = FakeWindowServer(error=b"Access violation")
+        with pytest.raises(TFTPError, match="Access violation"):
+            _upload(server, self.data)
+
+    def test_upload_no_server(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as silent:
+            silent.bind(("127.0.0.1", 0))
+            with pytest.raises(TFTPError, match="Timed out"):
+                upload(
+                    "127.0.0.1",
+                    "firmware.bin",
+                    self.data,
+                    512,
+                    8,
+                    0.2,
+                    Mock(),
+                    port=silent.getsockname()[1],
+                    retransmit=0.05,
+                )
+
+    def test_upload_invalid_windowsize(self):
+        with pytest.raises(ValueError, match="windowsize"):
+            upload("127.0.0.1", "firmware.bin", self.data, 512, 0, 1, Mock())